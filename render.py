@@ -1,56 +1,1731 @@
 import math
-import msvcrt
 import time
 import os
+import io
+import sys
+import json
+import re
+import random
+import struct
+import zlib
+import select
+import signal
+import threading
+import argparse
+import multiprocessing
+from multiprocessing import shared_memory
+from array import array
+from collections import deque
 import ctypes
 from ctypes import wintypes
 
-class Big3D:
+try:
+    import msvcrt
+except ImportError:  # Not on Windows - keyboard comes from termios instead
+    msvcrt = None
+
+try:
+    import termios
+    import tty
+except ImportError:  # Windows
+    termios = None
+
+try:
+    import numpy as np
+except ImportError:  # Optional - falls back to the per-column renderer
+    np = None
+
+# Frame cells are 16-bit codes: glyph (ASCII) in the low byte, style code in the high byte.
+# Style codes index a shared table of SGR parameter strings; 0 is the terminal default.
+STYLE_SGR = ['']
+STYLE_CODES = {'': 0}
+STYLE_ESCAPES = ['\033[0m']
+GLYPHS = [chr(i) for i in range(256)]
+
+def style_code(sgr):
+    code = STYLE_CODES.get(sgr)
+    if code is None:
+        code = len(STYLE_SGR)
+        if code > 255:
+            raise ValueError("too many distinct styles for the frame buffer")
+        STYLE_CODES[sgr] = code
+        STYLE_SGR.append(sgr)
+        STYLE_ESCAPES.append(f"\033[0;{sgr}m")
+    return code
+
+def cell_code(char, sgr=''):
+    return ord(char) | style_code(sgr) << 8
+
+STYLE_BYTE = 1 if sys.byteorder == 'little' else 0  # Offset of the style byte in a cell's memory
+
+def dim_sgr(sgr):
+    """Faint variant of a style: drops bold, adds dim"""
+    params = [p for p in sgr.split(';') if p not in ('', '1', '2')]
+    return ';'.join(['2'] + params)
+
+# Ceiling / floor styles by lighting level (normal, dim, black)
+CEILING_STYLES = ("34", "2;34", "2;30")
+FLOOR_STYLES = ("37", "2;37", "2;30")
+CEILING_CELLS = [[cell_code(char, style) for style in CEILING_STYLES] for char in '#-']
+FLOOR_CELLS = [[cell_code(char, style) for style in FLOOR_STYLES] for char in '_,']
+
+# Baked texel levels: every texel is pre-styled once per lighting level
+BOLD, NORMAL, DIM, BLACK = 0, 1, 2, 3
+
+def bake_texel(char, color):
+    """All lit variants of one texel as ready-to-draw cell codes"""
+    return (cell_code(char, f"1;{color}"), cell_code(char, str(color)),
+            cell_code(char, f"2;{color}"), cell_code(char, "2;30"))
+
+# Sprite brightness thresholds -> baked level, brightest first
+GHOST_LEVELS = ((0.8, BOLD), (0.4, NORMAL), (0.3, DIM))
+ITEM_LEVELS = ((0.6, BOLD), (0.2, NORMAL))
+
+# Minimap cells
+MINIMAP_WALL = cell_code('#', '37')  # White walls
+MINIMAP_EMPTY = cell_code(' ', '30')  # Black empty space
+MINIMAP_PLAYER = cell_code('@', '97')  # Bright white player
+MINIMAP_GHOSTS = [cell_code('*', color) for color in ('91', '95', '96', '93')]  # Red, Magenta, Cyan, Yellow
+MINIMAP_PICKUP = cell_code('+', '92')  # Green plus
+MINIMAP_GATE = cell_code('G', '93')  # Yellow gate
+MINIMAP_SIZE = 22  # Minimap cells shown per side; larger levels scroll with the player
+MINIMAP_SPAN = 110  # Bigger levels are downsampled so the whole map is at most this many cells across
+# Downsampled minimap cells by share of walls, open to solid
+MINIMAP_SHADES = [MINIMAP_EMPTY, cell_code('.', '2;37'), cell_code(':', '2;37'), cell_code('=', '37'), MINIMAP_WALL]
+PICKUP_CHUNK = 16  # Pickups are bucketed in square chunks this many cells wide (>= view radius)
+
+# Ghost flow field directions: step index i points at angle i * 45 degrees in (x, y)
+FLOW_STEPS = [(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)]
+FLOW_VECTORS = [(math.cos(i * math.pi / 4), math.sin(i * math.pi / 4)) for i in range(8)]
+FLOW_NONE = 8
+# Levels above this many cells search only FLOW_RADIUS steps out - a whole-level search
+# is pure Python (~28 ms at 129x129) and reruns every time the player enters a new cell
+FLOW_FULL_CELLS = 64 * 64
+FLOW_RADIUS = 64
+
+# Simulation step (seconds). Movement, drain and gravity constants are per tick.
+TICK_DT = 0.03
+
+MOVE_SPEED = 0.04  # Slower movement
+ROTATE_SPEED = 0.06  # Slower rotation/sensitivity
+MAX_KEY_REPEAT = 3  # Queued presses of one key applied in a single tick (no tunnelling through walls)
+
+class FrameBuffer:
+    """Row-major screen of cell codes, allocated once per resolution.
+
+    Every draw pass writes codes straight into `cells` (index x + y * width).
+    """
+
+    def __init__(self, width=0, height=0):
+        self.width = self.height = 0
+        self.cells = array('H')
+        self.resize(width, height)
+
+    def resize(self, width, height):
+        """Reallocate for a new size; returns True if the size changed"""
+        if (width, height) == (self.width, self.height):
+            return False
+        self.width, self.height = width, height
+        self.cells = array('H', [0]) * (width * height)
+        return True
+
+    def blit(self, x, y, width, codes):
+        """Copy a row-major block of codes to (x, y), clipped to the screen"""
+        cells = self.cells
+        x0, x1 = max(0, -x), min(width, self.width - x)
+        if x1 <= x0:
+            return
+        for row in range(max(0, -y), min(len(codes) // width, self.height - y)):
+            src = row * width
+            dst = (y + row) * self.width + x
+            cells[dst + x0:dst + x1] = codes[src + x0:src + x1]
+
+    def restyle(self, table, start=0, end=None):
+        """Map the style of cells[start:end] through a 256-byte style code table, glyphs untouched"""
+        end = len(self.cells) if end is None else end
+        if end <= start:
+            return
+        raw = memoryview(self.cells).cast('B')[2 * start:2 * end]
+        block = bytearray(raw)  # Contiguous copy - strided slices of a bytearray are fast
+        block[STYLE_BYTE::2] = block[STYLE_BYTE::2].translate(table)
+        raw[:] = block
+
+    def encode(self, start, end, style=0):
+        """Terminal text for cells[start:end], switching SGR only when the style changes.
+
+        Returns (text, style in effect afterwards).
+        """
+        parts = []
+        cells = self.cells
+        for i in range(start, end):
+            code = cells[i]
+            if code >> 8 != style:
+                style = code >> 8
+                parts.append(STYLE_ESCAPES[style])
+            parts.append(GLYPHS[code & 0xFF])
+        return ''.join(parts), style
+
+class FrameEncoder:
+    """Turns a FrameBuffer into terminal text.
+
+    SGR codes are only emitted when the style changes from the previous cell, and
+    only the cells that changed since the last emitted frame are sent.
+    """
+
+    def __init__(self, merge_gap=2):
+        self.merge_gap = merge_gap  # Unchanged cells cheaper to resend than a cursor jump
+        self.prev = None
+        self.prev_size = None
+        self.prev_status = None
+        self.full_size = 0
+        self.full_repaints = 0
+        self.style = 0
+        # Output metrics
+        self.frame_bytes = 0
+        self.total_bytes = 0
+        self.frames = 0
+
+    @property
+    def bytes_per_frame(self):
+        return self.total_bytes / self.frames if self.frames else 0
+
+    def encode_diff(self, frame):
+        parts = []
+        size = 0
+        cells, prev, width = frame.cells, self.prev, frame.width
+        if cells == prev:
+            return parts
+        for y in range(frame.height):
+            row_start = y * width
+            row_end = row_start + width
+            if cells[row_start:row_end] == prev[row_start:row_end]:
+                continue
+            x = row_start
+            while x < row_end:
+                if cells[x] == prev[x]:
+                    x += 1
+                    continue
+                # Extend the run across short unchanged gaps
+                start = end = x
+                x += 1
+                while x < row_end:
+                    if cells[x] != prev[x]:
+                        end = x
+                    elif x - end > self.merge_gap:
+                        break
+                    x += 1
+                text, self.style = frame.encode(start, end + 1, self.style)
+                chunk = f"\033[{y + 1};{start - row_start + 1}H" + text
+                parts.append(chunk)
+                size += len(chunk)
+            if size >= self.full_size:
+                return None
+        return parts
+
+    def encode(self, frame, status):
+        """Returns the text that brings the terminal from the last frame to this one"""
+        self.style = 0
+        parts = None
+        size = (frame.width, frame.height)
+        # Never touch the bottom-right cell: the terminal would wrap and scroll out of step with prev
+        status = status[:max(0, frame.width - 1)]
+        if self.prev is not None and self.prev_size == size:
+            parts = self.encode_diff(frame)
+            if parts is not None and status != self.prev_status:
+                parts.append(f"\033[{frame.height + 1};1H")
+                parts.append(f"\033[0m\033[K{status}" if self.style else f"\033[K{status}")
+                self.style = 0
+        
+        if parts is None:
+            # First frame, resize or a diff bigger than the frame itself
+            self.style = 0
+            self.full_repaints += 1
+            parts = ['\033[2J\033[H' if self.prev is not None else '\033[H']
+            for y in range(frame.height):
+                text, self.style = frame.encode(y * frame.width, (y + 1) * frame.width, self.style)
+                parts.append(text + '\n')
+            self.full_size = sum(len(part) for part in parts)
+            parts.append(f"\033[0m{status}" if self.style else status)
+            self.style = 0
+        elif self.style:
+            parts.append('\033[0m')
+
+        out = ''.join(parts)
+        if self.prev is not None and self.prev_size == size:
+            self.prev[:] = frame.cells
+        else:
+            self.prev = array('H', frame.cells)
+        self.prev_size, self.prev_status = size, status
+        self.frame_bytes = len(out.encode('utf-8'))
+        self.total_bytes += self.frame_bytes
+        self.frames += 1
+        return out
+
+class StageProfiler:
+    """Times named stages of each frame and keeps rolling stats for the HUD.
+
+    Stages are timed with lap() - one perf_counter call per stage boundary - and
+    end_frame() closes the frame, optionally appending it to a JSON-lines trace.
+    """
+
+    def __init__(self, window=120, trace_path=None):
+        self.window = window
+        self.samples = {}  # stage -> deque of recent durations (seconds)
+        self.order = []  # stages in first-seen order, for the HUD
+        self.current = {}
+        self.frame_start = time.perf_counter()
+        self.trace = open(trace_path, 'w', buffering=1 << 16) if trace_path else None
+        self.hud_text = ''
+        self.frames = 0
+
+    now = staticmethod(time.perf_counter)
+
+    def lap(self, stage, started):
+        """Record time since `started` against a stage; returns the new timestamp"""
+        now = time.perf_counter()
+        self.current[stage] = self.current.get(stage, 0.0) + now - started
+        return now
+
+    def begin_frame(self):
+        self.frame_start = time.perf_counter()
+
+    def end_frame(self, frame_no):
+        self.current['frame'] = time.perf_counter() - self.frame_start
+        for stage, duration in self.current.items():
+            samples = self.samples.get(stage)
+            if samples is None:
+                samples = self.samples[stage] = deque(maxlen=self.window)
+                self.order.append(stage)
+            samples.append(duration)
+        if self.trace:
+            self.trace.write(json.dumps({'frame': frame_no, 'ms': {
+                stage: round(duration * 1000, 3) for stage, duration in self.current.items()}}) + '\n')
+        self.current = {}
+        self.frames += 1
+        # Sorting every window is cheap, but there is no need to do it every frame
+        if self.frames % 10 == 1:
+            self.hud_text = self.format_hud()
+
+    def average(self, stage):
+        samples = self.samples.get(stage)
+        return sum(samples) / len(samples) if samples else 0.0
+
+    def p99(self, stage):
+        samples = self.samples.get(stage)
+        if not samples:
+            return 0.0
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+
+    def summary(self):
+        return {stage: (self.average(stage) * 1000, self.p99(stage) * 1000) for stage in self.order}
+
+    def format_hud(self):
+        return ' '.join(f"{stage} {avg:.1f}/{p99:.1f}" for stage, (avg, p99) in self.summary().items()) + ' ms avg/p99'
+
+    def close(self):
+        if self.trace:
+            self.trace.close()
+            self.trace = None
+
+class Lighting:
+    """Flashlight coefficients for the current resolution, quantized into brightness buckets.
+
+    Every pass reads the same per-cell bucket buffer (row-major, one byte per cell)
+    and turns it back into a brightness with `values`. The buffer is rebuilt only
+    when the resolution changes or battery / torch state moves the buckets.
+    """
+
+    BUCKETS = 64  # Bucket 0 is pitch dark
+    MIN_LIGHT = 0.1  # Dimmest brightness worth a non-dark bucket
+    MAX_LIGHT = 1024.0
+    FINE_LEVELS = 256  # Resolution of the per-cell coefficient index
+
+    def __init__(self):
+        self.width = self.height = 0
+        self.coeff = []
+        self.coeff_index = bytearray()
+        self.buckets = bytearray()
+        self.key = None
+        self.rebuilds = 0
+        span = math.log(self.MAX_LIGHT / self.MIN_LIGHT)
+        self.bucket_step = span / (self.BUCKETS - 1)
+        self.fine_step = span / (self.FINE_LEVELS - 1)
+        # Representative brightness of each bucket (geometric middle)
+        self.values = [0.0] + [self.MIN_LIGHT * math.exp((b - 0.5) * self.bucket_step)
+                               for b in range(1, self.BUCKETS)]
+        # Ceiling/floor levels (normal, dim, black) only depend on the bucket
+        self.band_levels = []
+        for value in self.values:
+            brightness = max(0, min(90, value * 0.1))
+            self.band_levels.append(0 if brightness > 20 else 1 if brightness > 5 else 2)
+
+    def bucket_of(self, value):
+        if value < self.MIN_LIGHT:
+            return 0
+        return min(self.BUCKETS - 1, 1 + int(math.log(value / self.MIN_LIGHT) / self.bucket_step))
+
+    def resize(self, width, height, light_flashlight):
+        """Rebuild the coefficient table for a new screen size; returns True if it changed"""
+        if (width, height) == (self.width, self.height):
+            return False
+        self.width, self.height = width, height
+        self.coeff = self.calculate_flashlight_coeff(width, height)
+        # Log-scale index per cell, so a battery change is a single bytes.translate()
+        index = bytearray(len(self.coeff))
+        for i, coeff in enumerate(self.coeff):
+            value = light_flashlight * coeff
+            if value >= self.MIN_LIGHT:
+                index[i] = min(self.FINE_LEVELS - 1, 1 + int(math.log(value / self.MIN_LIGHT) / self.fine_step))
+        self.coeff_index = index
+        self.key = None
+        return True
+
+    def update(self, battery, torch_enabled):
+        """Refresh the bucket buffer if battery or torch state moved any bucket"""
+        if not torch_enabled:
+            key = 0
+        else:
+            # Battery quantized to the fine log step - smaller changes cannot move a bucket
+            key = 1 + int(-math.log(max(battery, 1e-9)) / self.fine_step)
+        if key == self.key:
+            return False
+        self.key = key
+        self.rebuilds += 1
+        if not torch_enabled:
+            self.buckets = bytearray(len(self.coeff_index))
+            return True
+        scale = math.exp(-(key - 1) * self.fine_step)
+        table = bytes([0] + [self.bucket_of(scale * self.MIN_LIGHT * math.exp((i - 0.5) * self.fine_step))
+                             for i in range(1, self.FINE_LEVELS)])
+        self.buckets = self.coeff_index.translate(table)
+        return True
+
+    @staticmethod
+    def calculate_flashlight_coeff(width, height):
+        """Pre-calculate torch brightness coefficients"""
+        coeff = []
+        for y in range(height):
+            for x in range(width):
+                lghtx = 4.0 * (x - width/2) / width  # Tighter beam
+                lghty = 4.0 * (y - height/2) / height
+                lght = math.exp(-lghtx*lghtx) * math.exp(-lghty*lghty)
+                coeff.append(600.0 * lght * (1 + 0.3 * ((abs(y)%2) + (abs(x)%2))))
+        return coeff
+
+class Backdrop:
+    """Ceiling and floor cells for every screen position, one row-major layer each.
+
+    Neither depends on where the rays hit - only on (col, row) and the lighting
+    bucket there - so both layers are rebuilt only when the resolution or the
+    Lighting buckets change, and the wall pass copies column slices out of them.
+    """
+
     def __init__(self):
+        self.ceiling = array('H')
+        self.floor = array('H')
+        self.key = None
+        self.size = None  # Resolution the glyph layouts below were built for
+        self.ceiling_glyphs = self.floor_glyphs = bytearray()  # Cells with glyph bytes set, styles zero
+
+    def update(self, lighting):
+        """Rebuild both layers if lighting was resized or rebucketed; returns True if it did"""
+        key = (lighting.width, lighting.height, lighting.rebuilds)
+        if key == self.key:
+            return False
+        self.key = key
+        width, height = lighting.width, lighting.height
+        if (width, height) != self.size:
+            self.size = (width, height)
+            self.ceiling_glyphs = self.glyph_layout(
+                (bytes([CEILING_CELLS[0][0] & 0xFF, CEILING_CELLS[1][0] & 0xFF, CEILING_CELLS[1][0] & 0xFF])
+                 * (width // 3 + 2))[row % 3:row % 3 + width] for row in range(height))
+            self.floor_glyphs = self.glyph_layout(
+                bytes([FLOOR_CELLS[0 if row > height * 0.8 else 1][0] & 0xFF]) * width for row in range(height))
+        
+        # Glyphs only depend on the position, styles only on the lighting level
+        levels = lighting.buckets.translate(bytes(lighting.band_levels).ljust(256, b'\0'))
+        self.ceiling = self.styled(self.ceiling_glyphs, levels, CEILING_CELLS[0])
+        self.floor = self.styled(self.floor_glyphs, levels, FLOOR_CELLS[0])
+        return True
+
+    @staticmethod
+    def glyph_layout(rows):
+        glyphs = b''.join(rows)
+        cells = bytearray(2 * len(glyphs))
+        cells[1 - STYLE_BYTE::2] = glyphs
+        return cells
+
+    @staticmethod
+    def styled(glyph_cells, levels, level_cells):
+        """Fill in the style byte of every cell from its lighting level"""
+        cells = bytearray(glyph_cells)
+        cells[STYLE_BYTE::2] = levels.translate(bytes(code >> 8 for code in level_cells).ljust(256, b'\0'))
+        return array('H', cells)
+
+class Minimap:
+    """Top-left overview of the level, pre-rendered once per level version and scale.
+
+    At scale s each minimap cell covers s x s level cells, shaded by how many of them
+    are walls. Each frame the part around the player is copied row by row into the
+    frame, and only the entities on it are plotted on top.
+    """
+
+    def __init__(self, scale=None):
+        self.fixed_scale = scale  # None picks one from the level size
+        self.scale = 1
+        self.width = self.height = 0
+        self.layer = array('H')
+        self.key = None
+
+    def update(self, level):
+        """Rebuild the static layer if the level or its tiles changed; returns True if it did"""
+        scale = self.fixed_scale or max(1, -(-max(level.width, level.height) // MINIMAP_SPAN))
+        key = (id(level), level.version, scale)
+        if key == self.key:
+            return False
+        self.key = key
+        self.scale = scale
+        self.width = -(-level.width // scale)
+        self.height = -(-level.height // scale)
+        layer = array('H')
+        solid, shades = level.solid, len(MINIMAP_SHADES) - 1
+        for top in range(0, level.height, scale):
+            rows = range(top, min(top + scale, level.height))
+            for left in range(0, level.width, scale):
+                right = min(left + scale, level.width)
+                walls = sum(solid.count(1, row * level.width + left, row * level.width + right) for row in rows)
+                layer.append(MINIMAP_SHADES[-(-walls * shades // (len(rows) * (right - left)))])
+        self.layer = layer
+        return True
+
+    def draw(self, frame, px, py):
+        """Copy the window around the player; returns (left, top, width, height) in minimap cells"""
+        view_w = min(self.width, MINIMAP_SIZE, frame.width)
+        view_h = min(self.height, MINIMAP_SIZE, frame.height)
+        left = max(0, min(self.width - view_w, int(px) // self.scale - view_w // 2))
+        top = max(0, min(self.height - view_h, int(py) // self.scale - view_h // 2))
+        cells, layer = frame.cells, self.layer
+        for y in range(view_h):
+            src = (top + y) * self.width + left
+            cells[y * frame.width:y * frame.width + view_w] = layer[src:src + view_w]
+        return left, top, view_w, view_h
+
+# Post-processing passes run in order on the finished frame, after every draw pass.
+# They only rewrite style codes or stamp cached blocks, so their cost does not depend
+# on how the cells were drawn.
+
+class TintPass:
+    """Whole frame in one style, glyphs kept (damage flash)"""
+
+    def __init__(self, sgr):
+        self.table = bytes([style_code(sgr)]) * 256
+
+    def apply(self, frame):
+        frame.restyle(self.table)
+
+class VignettePass:
+    """Dims the styles of every cell outside an ellipse around the screen centre"""
+
+    def __init__(self, radius=0.8):
+        self.radius = radius
+        self.size = None
+        self.spans = []  # (start, end) cell ranges outside the ellipse
+        self.table = b''
+
+    def apply(self, frame):
+        width, height = frame.width, frame.height
+        if (width, height) != self.size:
+            self.size = (width, height)
+            self.spans = []
+            for row in range(height):
+                ny = (row + 0.5 - height / 2) / (height / 2)
+                if ny * ny >= self.radius * self.radius:
+                    self.spans.append((row * width, (row + 1) * width))
+                    continue
+                half = int(width / 2 * math.sqrt(self.radius * self.radius - ny * ny))
+                self.spans.append((row * width, row * width + max(0, width // 2 - half)))
+                self.spans.append((row * width + min(width, width // 2 + half), (row + 1) * width))
+        if len(self.table) != len(STYLE_SGR):
+            # Styles registered since the last frame need a dim variant too
+            self.table = bytes(style_code(dim_sgr(sgr)) for sgr in list(STYLE_SGR))
+        table = self.table.ljust(256, b'\0')
+        for start, end in self.spans:
+            frame.restyle(table, start, end)
+
+class BannerPass:
+    """Block of text lines in one style, centred on the screen"""
+
+    def __init__(self, lines, sgr):
+        style = style_code(sgr) << 8
+        self.width = len(lines[0])
+        self.codes = array('H', [ord(char) | style for line in lines for char in line])
+        self.height = len(lines)
+
+    def apply(self, frame):
+        x = frame.width // 2 - self.width // 2
+        y = frame.height // 2 - 2
+        frame.blit(x, y, self.width, self.codes)
+
+GAME_OVER_BANNER = [
+    "  ####    ###   #   # #####    ####  #   # ##### ####  ",
+    " #       #   #  ## ## #       #    #  # #  #     #   # ",
+    " #  ###  #####  # # # #####   #    #  # #  ##### ####  ",
+    " #    #  #   #  #   # #       #    #   #   #     #   # ",
+    "  ####   #   #  #   # #####    ####    #   ##### #   # "
+]
+WIN_BANNER = [
+    " #   #  ####  #   #   #   #  ####  #   # # ",
+    " #   # #    # #   #   #   # #    # ##  # # ",
+    " #   # #    # #   #   # # # #    # # # # # ",
+    " # # # #    # #   #   # # # #    # #  ## # ",
+    "  # #   ####   ###     # #   ####  #   # # "
+]
+LOW_HP = 25  # At or below this the view closes in (vignette)
+HUD_STYLE = style_code("30;47") << 8  # Frame-time HUD row
+
+class FrameScheduler:
+    """Fixed-timestep simulation with rendering paced to an FPS cap.
+
+    due_ticks() says how many simulation steps are owed, render_due() whether a
+    frame should be drawn now, and wait() sleeps only until the next tick or frame.
+    When the simulation falls behind, render frames are skipped (at most
+    max_frame_skip in a row) so the world keeps its speed.
+    """
+
+    def __init__(self, tick_rate, fps_cap=60, max_catchup=5, max_frame_skip=4,
+                 clock=time.perf_counter, sleep=time.sleep):
+        self.tick_dt = 1.0 / tick_rate
+        self.frame_dt = 1.0 / fps_cap if fps_cap else 0.0
+        self.max_catchup = max_catchup  # Ticks run back to back before dropping the backlog
+        self.max_frame_skip = max_frame_skip
+        self.clock = clock
+        self.sleep = sleep
+        now = clock()
+        self.next_tick = now
+        self.next_frame = now
+        self.behind = False
+        self.skipped_in_row = 0
+        # Counters
+        self.ticks = 0
+        self.ticks_dropped = 0
+        self.frames = 0
+        self.frames_skipped = 0
+
+    def due_ticks(self):
+        now = self.clock()
+        due = 0
+        while self.next_tick <= now and due < self.max_catchup:
+            self.next_tick += self.tick_dt
+            due += 1
+        if self.next_tick <= now:
+            # Hopelessly behind (e.g. the process was suspended) - drop the backlog
+            dropped = int((now - self.next_tick) / self.tick_dt) + 1
+            self.next_tick += dropped * self.tick_dt
+            self.ticks_dropped += dropped
+        self.behind = due > 1
+        self.ticks += due
+        return due
+
+    def render_due(self):
+        if self.clock() < self.next_frame:
+            return False
+        if self.behind and self.skipped_in_row < self.max_frame_skip:
+            # Spend this slot catching the simulation up instead
+            self.skipped_in_row += 1
+            self.frames_skipped += 1
+            return False
+        return True
+
+    def frame_rendered(self):
+        now = self.clock()
+        self.frames += 1
+        self.skipped_in_row = 0
+        self.next_frame += self.frame_dt
+        if self.next_frame < now:
+            self.next_frame = now  # Late frame - don't try to burst to catch up
+
+    def wait(self):
+        """Sleep for whatever is left of the budget before the next tick or frame"""
+        delay = min(self.next_tick, self.next_frame) - self.clock()
+        if delay > 0:
+            self.sleep(delay)
+
+class QualityController:
+    """Adaptive render quality driven by a frame-time budget.
+
+    Each level is (column step, sprite step, view distance factor): level 0 casts
+    every column at full view distance, higher levels cast every 2nd or 3rd column
+    and widen it, sample sprites more coarsely and stop rays sooner. Frame times
+    are averaged over `window` frames; quality drops when the average is over the
+    target and only rises again when it is under `headroom` times the target for
+    `hold` windows in a row, so it settles instead of oscillating.
+    """
+
+    LEVELS = ((1, 1, 1.0), (2, 1, 1.0), (2, 2, 0.85), (3, 2, 0.75), (3, 3, 0.6))
+
+    def __init__(self, target_ms, window=20, headroom=0.6, hold=3):
+        self.target = target_ms / 1000.0
+        self.window = window
+        self.headroom = headroom
+        self.hold = hold
+        self.level = 0
+        self.elapsed = 0.0
+        self.samples = 0
+        self.calm_windows = 0  # Consecutive windows with room to step up
+        self.changes = 0
+
+    def frame(self, seconds):
+        """Feed one frame's render time; returns True if the quality level changed"""
+        self.elapsed += seconds
+        self.samples += 1
+        if self.samples < self.window:
+            return False
+        average = self.elapsed / self.samples
+        self.elapsed, self.samples = 0.0, 0
+        if average > self.target and self.level < len(self.LEVELS) - 1:
+            self.level += 1
+            self.calm_windows = 0
+        elif average < self.target * self.headroom and self.level > 0:
+            self.calm_windows += 1
+            if self.calm_windows < self.hold:
+                return False
+            self.level -= 1
+            self.calm_windows = 0
+        else:
+            self.calm_windows = 0
+            return False
+        self.changes += 1
+        return True
+
+    @property
+    def column_step(self):
+        return self.LEVELS[self.level][0]
+
+    @property
+    def sprite_step(self):
+        return self.LEVELS[self.level][1]
+
+    @property
+    def view_factor(self):
+        return self.LEVELS[self.level][2]
+
+    @property
+    def scale(self):
+        """Share of screen columns that get their own ray"""
+        return 1.0 / self.column_step
+
+class FrameWriter:
+    """Encodes and writes frames on a background thread so the game loop never blocks on the terminal.
+
+    submit() hands over a finished FrameBuffer and returns a spare one to draw the
+    next frame into. If the previous frame has not been picked up yet it is
+    dropped - the encoder diffs against what was actually written, so the
+    terminal stays consistent.
+    """
+
+    def __init__(self, fd, encoder):
+        self.fd = fd
+        self.encoder = encoder
+        self.cond = threading.Condition()
+        self.pending = None  # (frame, status) waiting for the writer
+        self.spares = []
+        self.running = True
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.thread = threading.Thread(target=self.write_loop, name="frame-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, frame, status):
+        with self.cond:
+            if self.pending is not None:
+                self.frames_dropped += 1
+                self.spares.append(self.pending[0])
+            self.pending = (frame, status)
+            spare = self.spares.pop() if self.spares else FrameBuffer()
+            self.cond.notify()
+        return spare
+
+    def write_loop(self):
+        while True:
+            with self.cond:
+                while self.pending is None and self.running:
+                    self.cond.wait()
+                if self.pending is None:
+                    return
+                frame, status = self.pending
+                self.pending = None
+            data = memoryview(self.encoder.encode(frame, status).encode('utf-8'))
+            while data:
+                written = os.write(self.fd, data)
+                data = data[written:]
+            with self.cond:
+                self.frames_written += 1
+                self.spares.append(frame)
+
+    def close(self):
+        """Write the last pending frame, then stop the thread"""
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        self.thread.join(timeout=2.0)
+
+# Session recordings: an 8-byte header (magic, version, flags) then a stream of
+# records, zlib-compressed when flag 1 is set. Each record is one type byte
+# plus a little-endian payload:
+#   'S' styles    first index (H), count (H), then per style: length (B) + SGR bytes
+#   'K' keyframe  time (d), width (H), height (H), every cell code (H each), status
+#   'D' delta     time (d), run count (I), runs of start (I) + count (H) + codes, status
+# status is a length (H) + UTF-8 text, or length 0xFFFF when it has not changed.
+RECORDING_MAGIC = b'B3DR'
+RECORDING_VERSION = 1
+RECORDING_ZLIB = 1
+STATUS_UNCHANGED = 0xFFFF
+
+def cells_le(cells):
+    """Cell codes as little-endian bytes"""
+    if sys.byteorder == 'little':
+        return cells.tobytes()
+    swapped = array('H', cells)
+    swapped.byteswap()
+    return swapped.tobytes()
+
+def cells_from_le(data):
+    cells = array('H')
+    cells.frombytes(data)
+    if sys.byteorder != 'little':
+        cells.byteswap()
+    return cells
+
+def changed_span(cells, prev, start, end):
+    """(first, last + 1) of the cells that differ in start..end, found by bisecting on slice equality"""
+    lo, hi = start, end
+    while lo < hi:  # Longest equal prefix
+        mid = (lo + hi + 1) // 2
+        if cells[start:mid] == prev[start:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    first = lo
+    lo, hi = first, end
+    while lo < hi:  # Longest equal suffix
+        mid = (lo + hi) // 2
+        if cells[mid:end] == prev[mid:end]:
+            hi = mid
+        else:
+            lo = mid + 1
+    return first, lo
+
+class SessionRecorder:
+    """Tees rendered frames into a recording file on a background thread.
+
+    record() only copies the frame's cells and queues them; diffing against the
+    previous frame, compression and buffered writes happen on the writer thread.
+    A keyframe is stored every `keyframe_interval` frames, on resize, and whenever
+    the delta would not be smaller.
+    """
+
+    def __init__(self, path, compress=True, keyframe_interval=300):
+        self.file = open(path, 'wb', buffering=1 << 20)
+        self.file.write(struct.pack('<4sHH', RECORDING_MAGIC, RECORDING_VERSION, RECORDING_ZLIB if compress else 0))
+        self.compressor = zlib.compressobj(6) if compress else None
+        self.keyframe_interval = keyframe_interval
+        self.started = time.perf_counter()
+        self.queue = deque()
+        self.cond = threading.Condition()
+        self.running = True
+        self.styles_written = 0
+        self.prev = None
+        self.prev_size = None
+        self.prev_status = None
+        self.since_keyframe = 0
+        self.frames = 0
+        self.raw_bytes = 0  # Record bytes before compression
+        self.thread = threading.Thread(target=self.write_loop, name="session-recorder", daemon=True)
+        self.thread.start()
+
+    def record(self, frame, status):
+        entry = (time.perf_counter() - self.started, frame.width, frame.height, array('H', frame.cells), status)
+        with self.cond:
+            self.queue.append(entry)
+            self.cond.notify()
+
+    def write_loop(self):
+        while True:
+            with self.cond:
+                while not self.queue and self.running:
+                    self.cond.wait()
+                if not self.queue:
+                    return
+                entry = self.queue.popleft()
+            self.write_frame(*entry)
+
+    def write(self, data):
+        self.raw_bytes += len(data)
+        if self.compressor is not None:
+            data = self.compressor.compress(data)
+        self.file.write(data)
+
+    def write_frame(self, timestamp, width, height, cells, status):
+        if len(STYLE_SGR) > self.styles_written:
+            new = STYLE_SGR[self.styles_written:]
+            self.write(b'S' + struct.pack('<HH', self.styles_written, len(new)) +
+                       b''.join(bytes([len(sgr)]) + sgr.encode('ascii') for sgr in new))
+            self.styles_written += len(new)
+        
+        if status == self.prev_status:
+            status_bytes = struct.pack('<H', STATUS_UNCHANGED)
+        else:
+            encoded = status.encode('utf-8')
+            status_bytes = struct.pack('<H', len(encoded)) + encoded
+        
+        record = None
+        prev = self.prev
+        if prev is not None and self.prev_size == (width, height) and self.since_keyframe < self.keyframe_interval:
+            runs = []
+            for row_start in range(0, width * height, width):
+                row_end = row_start + width
+                if cells[row_start:row_end] != prev[row_start:row_end]:
+                    first, last = changed_span(cells, prev, row_start, row_end)
+                    runs.append(struct.pack('<IH', first, last - first) + cells_le(cells[first:last]))
+            record = b'D' + struct.pack('<dI', timestamp, len(runs)) + b''.join(runs) + status_bytes
+            if len(record) >= width * height * 2:
+                record = None
+        if record is None:
+            record = b'K' + struct.pack('<dHH', timestamp, width, height) + cells_le(cells) + status_bytes
+            self.since_keyframe = 0
+        self.since_keyframe += 1
+        self.write(record)
+        self.prev, self.prev_size, self.prev_status = cells, (width, height), status
+        self.frames += 1
+
+    def close(self):
+        """Write everything queued, then close the file"""
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        self.thread.join()
+        if self.compressor is not None:
+            self.file.write(self.compressor.flush())
+        self.file.close()
+
+class RecordingReader:
+    """Streams (time, FrameBuffer, status, record bytes) back out of a recording"""
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        magic, version, flags = struct.unpack('<4sHH', self.file.read(8))
+        if magic != RECORDING_MAGIC or version != RECORDING_VERSION:
+            raise ValueError(f"{path} is not a session recording")
+        self.decompressor = zlib.decompressobj() if flags & RECORDING_ZLIB else None
+        self.buffer = bytearray()
+        self.pos = 0
+        self.consumed = 0  # Record bytes read so far (before decompression)
+        self.styles = bytearray(256)  # Recorded style code -> style code in this process
+
+    def read(self, count):
+        while len(self.buffer) - self.pos < count:
+            chunk = self.file.read(1 << 16)
+            if not chunk:
+                raise EOFError
+            if self.decompressor is not None:
+                chunk = self.decompressor.decompress(chunk)
+            del self.buffer[:self.pos]
+            self.pos = 0
+            self.buffer += chunk
+        data = bytes(self.buffer[self.pos:self.pos + count])
+        self.pos += count
+        self.consumed += count
+        return data
+
+    def read_status(self, status):
+        length, = struct.unpack('<H', self.read(2))
+        return status if length == STATUS_UNCHANGED else self.read(length).decode('utf-8')
+
+    def frames(self):
+        frame = FrameBuffer()
+        status = ''
+        try:
+            while True:
+                start = self.consumed
+                kind = self.read(1)
+                if kind == b'S':
+                    first, count = struct.unpack('<HH', self.read(4))
+                    for index in range(first, first + count):
+                        length, = self.read(1)
+                        self.styles[index] = style_code(self.read(length).decode('ascii'))
+                    continue
+                if kind == b'K':
+                    timestamp, width, height = struct.unpack('<dHH', self.read(12))
+                    frame.resize(width, height)
+                    frame.cells[:] = cells_from_le(self.read(width * height * 2))
+                    frame.restyle(self.styles)
+                elif kind == b'D':
+                    timestamp, runs = struct.unpack('<dI', self.read(12))
+                    for _ in range(runs):
+                        first, count = struct.unpack('<IH', self.read(6))
+                        frame.cells[first:first + count] = cells_from_le(self.read(count * 2))
+                        frame.restyle(self.styles, first, first + count)
+                else:
+                    raise ValueError(f"corrupt recording: record type {kind!r}")
+                status = self.read_status(status)
+                yield timestamp, frame, status, self.consumed - start
+        except EOFError:
+            return
+        finally:
+            self.file.close()
+
+def play_recording(path, out, speed=1.0, trace_path=None):
+    """Write a recording to a terminal at `speed` times real time (0 = as fast as possible).
+
+    Returns per-frame (record bytes, terminal bytes).
+    """
+    encoder = FrameEncoder()
+    trace = open(trace_path, 'w') if trace_path else None
+    sizes = []
+    started = time.perf_counter()
+    out.write('\033[2J\033[H')
+    for index, (timestamp, frame, status, record_bytes) in enumerate(RecordingReader(path).frames()):
+        if speed > 0:
+            delay = started + timestamp / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        out.write(encoder.encode(frame, status))
+        out.flush()
+        sizes.append((record_bytes, encoder.frame_bytes))
+        if trace is not None:
+            trace.write(json.dumps({'frame': index, 't': round(timestamp, 4), 'record_bytes': record_bytes,
+                                    'terminal_bytes': encoder.frame_bytes}) + '\n')
+    if trace is not None:
+        trace.close()
+    out.write('\033[0m\n')
+    return sizes
+
+class ResizeWatcher:
+    """Terminal size without a query every frame.
+
+    With SIGWINCH (POSIX, main thread) the size is re-queried only after the signal
+    arrives; otherwise it is polled every `poll_interval` seconds. poll() is cheap
+    enough to call once per frame.
+    """
+
+    def __init__(self, query, listen=True, poll_interval=0.5, clock=time.perf_counter):
+        self.query = query  # () -> (cols, rows)
+        self.poll_interval = poll_interval
+        self.clock = clock
+        self.size = query()
+        self.dirty = False
+        self.next_poll = clock() + poll_interval
+        self.resizes = 0
+        self.previous_handler = None
+        self.event_driven = False
+        if listen and hasattr(signal, 'SIGWINCH') and threading.current_thread() is threading.main_thread():
+            self.previous_handler = signal.signal(signal.SIGWINCH, self.on_winch)
+            self.event_driven = True
+
+    def on_winch(self, signum, frame):
+        self.dirty = True  # Just a flag - the query happens on the next poll()
+
+    def poll(self):
+        """Current (cols, rows); re-queries only after SIGWINCH or when a poll is due"""
+        if self.event_driven:
+            if not self.dirty:
+                return self.size
+            self.dirty = False
+        else:
+            now = self.clock()
+            if now < self.next_poll:
+                return self.size
+            self.next_poll = now + self.poll_interval
+        size = self.query()
+        if size != self.size:
+            self.size = size
+            self.resizes += 1
+        return size
+
+    def close(self):
+        if self.event_driven:
+            signal.signal(signal.SIGWINCH, self.previous_handler or signal.SIG_DFL)
+            self.event_driven = False
+
+class InputState:
+    """Everything the player did since the last simulation tick"""
+
+    def __init__(self):
+        self.presses = {}  # key -> times pressed
+        self.mouse_dx = 0
+        self.mouse_dy = 0
+        self.quit = False
+
+    def press(self, key):
+        if key == 'x':
+            self.quit = True
+        self.presses[key] = self.presses.get(key, 0) + 1
+
+    def count(self, key):
+        return min(self.presses.get(key, 0), MAX_KEY_REPEAT)
+
+    def clear(self):
+        self.presses.clear()
+        self.mouse_dx = self.mouse_dy = 0
+
+class WindowsInput:
+    """msvcrt keyboard plus GetCursorPos mouse look"""
+
+    def __init__(self):
+        self.last_x, self.last_y = self.cursor_pos()
+
+    def cursor_pos(self):
+        try:
+            user32 = ctypes.windll.user32
+            point = wintypes.POINT()
+            user32.GetCursorPos(ctypes.byref(point))
+            return point.x, point.y
+        except:
+            return 0, 0
+
+    def poll(self, state):
+        # Drain every queued key, not just one per loop
+        while msvcrt.kbhit():
+            state.press(msvcrt.getch().decode(errors='ignore').lower())
+        x, y = self.cursor_pos()
+        state.mouse_dx += x - self.last_x
+        state.mouse_dy += y - self.last_y
+        self.last_x, self.last_y = x, y
+
+    def close(self):
+        pass
+
+class PosixInput:
+    """Non-blocking termios keyboard, with optional xterm mouse reports for look.
+
+    The terminal is put in cbreak mode (no line buffering or echo, Ctrl-C still
+    works). Each poll drains every pending byte with select().
+    """
+
+    MOUSE_REPORT = re.compile(rb'\x1b\[<(\d+);(\d+);(\d+)([Mm])')
+    CSI = re.compile(rb'\x1b\[[0-9;<?]*[@-~]')
+    PARTIAL = re.compile(rb'\x1b(\[[0-9;<?]*)?$')
+    CELL_PIXELS = (8, 16)  # Mouse cell size in the units mouse_sensitivity was tuned for
+
+    def __init__(self, fd=None, mouse=True, out=None):
+        self.fd = sys.stdin.fileno() if fd is None else fd
+        self.out = out or sys.stdout
+        self.mouse = mouse
+        self.pending = b''
+        self.last_cell = None
+        self.saved_mode = termios.tcgetattr(self.fd)
+        tty.setcbreak(self.fd)
+        if mouse:
+            # Report all motion, SGR encoding
+            self.out.write('\033[?1003h\033[?1006h')
+            self.out.flush()
+
+    def poll(self, state):
+        while select.select([self.fd], [], [], 0)[0]:
+            data = os.read(self.fd, 4096)
+            if not data:
+                break
+            self.feed(data, state)
+
+    def feed(self, data, state):
+        buf = self.pending + data
+        self.pending = b''
+        i = 0
+        while i < len(buf):
+            if buf[i] != 0x1b:
+                state.press(chr(buf[i]).lower())
+                i += 1
+                continue
+            match = self.MOUSE_REPORT.match(buf, i)
+            if match:
+                self.mouse_event(int(match.group(2)), int(match.group(3)), state)
+                i = match.end()
+                continue
+            if self.PARTIAL.match(buf, i):
+                self.pending = buf[i:]  # Rest of the sequence arrives with the next read
+                break
+            match = self.CSI.match(buf, i)
+            i = match.end() if match else i + 1  # Arrow keys etc. are ignored
+
+    def mouse_event(self, col, row, state):
+        if self.last_cell is not None:
+            state.mouse_dx += (col - self.last_cell[0]) * self.CELL_PIXELS[0]
+            state.mouse_dy += (row - self.last_cell[1]) * self.CELL_PIXELS[1]
+        self.last_cell = (col, row)
+
+    def close(self):
+        if self.mouse:
+            self.out.write('\033[?1003l\033[?1006l')
+            self.out.flush()
+        termios.tcsetattr(self.fd, termios.TCSADRAIN, self.saved_mode)
+
+class ScriptedInput:
+    """Input timeline for headless replays: tick -> (keys, mouse_dx, mouse_dy)"""
+
+    def __init__(self, timeline):
+        self.timeline = timeline
+        self.tick = 0
+
+    def poll(self, state):
+        keys, dx, dy = self.timeline.get(self.tick, ('', 0, 0))
+        for key in keys:
+            state.press(key)
+        state.mouse_dx += dx
+        state.mouse_dy += dy
+        self.tick += 1
+
+    def close(self):
+        pass
+
+def make_input_backend():
+    if msvcrt is not None:
+        return WindowsInput()
+    if termios is not None and sys.stdin.isatty():
+        return PosixInput()
+    return None
+
+# Level text format, one character per cell:
+#   '.' or ' ' floor, '#' and 'A'-'Z' walls (the letter picks the texture),
+#   '@' player start, '0'-'3' ghost spawn of that type, '+' health pickup, 'G' exit gate.
+# Lines starting with ';' are comments. Short rows are padded with wall.
+DEFAULT_LEVEL = """\
+######################
+#@.AAA......AAA.....##
+#.0AAA.1....AAA.....##
+#..+......+.........##
+#.CCCC.BB....CCCC.BB##
+#.CCCC.BB....CCCC.BB##
+#...................##
+#.2EEE.3....EEE.....##
+#..EEE......EEE.....##
+#...................##
+##.+......+........###
+##.AAAA.......AAAA.###
+##.AAAA.......AAAA.###
+##.................###
+##.BBB.CCC.DDD.EEE.###
+##.BBB.CCC.DDD.EEE.###
+##.................###
+##.................###
+##.AAA.BBB.CCC.DDD.###
+##.AAA.BBB.CCC.DDD.###
+##................G###
+######################
+"""
+MAZE_WALLS = b'ABCDE#'
+MAZE_REGION = 8  # Generated mazes switch wall texture every this many cells
+FLOOR = ord('.')
+
+class GameMap:
+    """Level grid as one byte per cell (row-major, index x + y * width) plus markers.
+
+    `tiles` holds the wall type byte or '.', `solid` is 1 for walls and `walkable`
+    its inverse; renderer, collision and ghost AI all read the masks.
+    """
+
+    def __init__(self, width, height, tiles, start=(1.5, 1.5), ghost_spawns=(), pickups=(), gate=None):
+        self.width, self.height = width, height
+        self.tiles = tiles
+        self.solid = tiles.translate(bytes(0 if c == FLOOR else 1 for c in range(256)))
+        self.walkable = self.solid.translate(bytes([1, 0]) + bytes(254))
+        self.start = start
+        self.ghost_spawns = list(ghost_spawns)  # (x, y, ghost type)
+        self.pickups = list(pickups)  # (x, y)
+        self.gate = gate
+        self.version = 0  # Bumped on every tile change, so caches and render workers can tell
+
+    def set_tile(self, x, y, tile):
+        """Change one cell to a wall type byte or FLOOR"""
+        index = y * self.width + x
+        self.tiles[index] = tile
+        self.solid[index] = 0 if tile == FLOOR else 1
+        self.walkable[index] = 1 - self.solid[index]
+        self.version += 1
+
+    def is_open(self, x, y):
+        """True when the point (x, y) is inside the map on a floor cell"""
+        return 0 <= x < self.width and 0 <= y < self.height and self.walkable[int(y) * self.width + int(x)] == 1
+
+    @classmethod
+    def parse(cls, text):
+        rows = [line.rstrip('\n') for line in text.splitlines() if not line.startswith(';')]
+        while rows and not rows[-1].strip():
+            rows.pop()
+        if not rows:
+            raise ValueError("empty map")
+        width, height = max(len(row) for row in rows), len(rows)
+        tiles = bytearray(b'#') * (width * height)
+        start, spawns, pickups, gate = (1.5, 1.5), [], [], None
+        for y, row in enumerate(rows):
+            for x, char in enumerate(row):
+                center = (x + 0.5, y + 0.5)
+                if char in '. @+G0123':
+                    tiles[x + y * width] = FLOOR
+                elif not (char == '#' or 'A' <= char <= 'Z'):
+                    raise ValueError(f"unknown map character {char!r} at {x},{y}")
+                else:
+                    tiles[x + y * width] = ord(char)
+                if char == '@':
+                    start = center
+                elif char == '+':
+                    pickups.append(center)
+                elif char == 'G':
+                    gate = center
+                elif char in '0123':
+                    spawns.append(center + (int(char),))
+        return cls(width, height, tiles, start, spawns, pickups, gate)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.parse(f.read())
+
+    @classmethod
+    def generate(cls, width, height, seed=None, loops=0.05):
+        """Seeded maze: one-cell corridors on odd coordinates, plus a share of knocked-out walls for loops"""
+        rng = random.Random(seed)
+        width, height = max(5, width | 1), max(5, height | 1)
+        
+        # Solid wall, textured in square regions
+        tiles = bytearray(width * height)
+        for band in range(0, height, MAZE_REGION):
+            row = bytearray()
+            for x in range(0, width, MAZE_REGION):
+                row += bytes([rng.choice(MAZE_WALLS)]) * MAZE_REGION
+            row = row[:width]
+            for y in range(band, min(band + MAZE_REGION, height)):
+                tiles[y * width:(y + 1) * width] = row
+        
+        # Iterative depth-first carve from the top-left corridor cell
+        tiles[width + 1] = FLOOR
+        stack = [(1, 1)]
+        while stack:
+            x, y = stack[-1]
+            options = [(dx, dy) for dx, dy in ((2, 0), (-2, 0), (0, 2), (0, -2))
+                       if 0 < x + dx < width - 1 and 0 < y + dy < height - 1
+                       and tiles[(y + dy) * width + x + dx] != FLOOR]
+            if not options:
+                stack.pop()
+                continue
+            dx, dy = rng.choice(options)
+            tiles[(y + dy // 2) * width + x + dx // 2] = FLOOR
+            tiles[(y + dy) * width + x + dx] = FLOOR
+            stack.append((x + dx, y + dy))
+        
+        # Open some walls between corridors so ghosts can come from more than one side
+        for _ in range(int(loops * width * height / 4)):
+            x, y = rng.randrange(1, width - 1), rng.randrange(1, height - 1)
+            if (x + y) % 2 and (tiles[y * width + x - 1] == tiles[y * width + x + 1] == FLOOR
+                                or tiles[(y - 1) * width + x] == tiles[(y + 1) * width + x] == FLOOR):
+                tiles[y * width + x] = FLOOR
+        
+        # Corridor cells are all odd coordinates; place markers on them
+        def corridor():
+            return rng.randrange(1, width - 1, 2) + 0.5, rng.randrange(1, height - 1, 2) + 0.5
+        
+        start, gate = (1.5, 1.5), (width - 1.5, height - 1.5)
+        spawns = []
+        while len(spawns) < 4:
+            x, y = corridor()
+            if math.hypot(x - start[0], y - start[1]) >= min(8, width // 2):
+                spawns.append((x, y, len(spawns)))
+        pickups = [corridor() for _ in range(max(4, width * height // 400))]
+        return cls(width, height, tiles, start, spawns, pickups, gate)
+
+PVS_CACHE_ROWS = 4096  # Rows kept before the cache starts over (~2.5 MB at the default radius)
+PVS_QUADRANTS = ((1, 1), (1, -1), (-1, -1), (-1, 1))
+
+class Visibility:
+    """Potentially visible set: which cells within `radius` each cell of a level can see.
+
+    One row per source cell, a (2r+1)^2 byte window centred on it, and cached. A cell is
+    marked when any segment from any point of the source cell reaches any point of it
+    without crossing a solid cell, so nothing actually in view is ever culled. sees() is
+    then a dict lookup and an index. Rows are built the first time a cell is asked about,
+    because a full table for a 1000x1000 level would not fit.
+    """
+
+    def __init__(self, level, radius):
+        self.level = level
+        self.radius = radius
+        self.side = 2 * radius + 1
+        self.rows = {}
+        self.version = level.version
+
+    def row(self, cx, cy):
+        """Visibility window of cell (cx, cy); index (y - cy + r) * side + (x - cx + r)"""
+        if self.version != self.level.version:
+            self.rows.clear()
+            self.version = self.level.version
+        key = cy * self.level.width + cx
+        row = self.rows.get(key)
+        if row is None:
+            if len(self.rows) >= PVS_CACHE_ROWS:
+                self.rows.clear()
+            row = self.build_row(cx, cy)
+            self.rows[key] = row
+        return row
+
+    def sees(self, ax, ay, bx, by):
+        """Can any point of the cell holding (ax, ay) see the cell holding (bx, by)?"""
+        ax, ay, bx, by = int(ax), int(ay), int(bx), int(by)
+        dx, dy, r = bx - ax, by - ay, self.radius
+        if not (-r <= dx <= r and -r <= dy <= r):
+            return False
+        return self.row(ax, ay)[(dy + r) * self.side + dx + r] == 1
+
+    def mask(self, px, py, xs, ys):
+        """NumPy bool array: which of the points (xs, ys) the cell holding (px, py) can see"""
+        cx, cy, r = int(px), int(py), self.radius
+        dx = xs.astype(np.intp) - cx
+        dy = ys.astype(np.intp) - cy
+        inside = (np.abs(dx) <= r) & (np.abs(dy) <= r)
+        row = np.frombuffer(self.row(cx, cy), np.uint8)
+        return inside & (row[np.where(inside, (dy + r) * self.side + dx + r, 0)] == 1)
+
+    def build_row(self, cx, cy):
+        row = bytearray(self.side * self.side)
+        row[self.radius * self.side + self.radius] = 1
+        for sx, sy in PVS_QUADRANTS:
+            self.scan_quadrant(row, cx, cy, sx, sy)
+        return bytes(row)
+
+    def scan_quadrant(self, row, cx, cy, sx, sy):
+        """Precise permissive field of view (Duerig) over one quadrant of the window.
+
+        Quadrant coordinates put the source cell at [0, 1]^2 and cell (x, y) at
+        [x, x + 1] x [y, y + 1]. Each view is the wedge of still-open lines between a
+        shallow and a steep line [xi, yi, xf, yf]; blocking cells narrow or split it and
+        leave bumps, the corners the opposite line may have to pivot around. Cells are
+        visited in diagonals of growing x + y, so every blocker is seen before the cells
+        it can hide. Cells off the map count as solid.
+        """
+        level, r, side = self.level, self.radius, self.side
+        map_w, map_h, solid = level.width, level.height, level.solid
+
+        def slope(line, x, y):
+            # > 0: (x, y) is below the line, < 0: above, 0: on it (steep lines run the other way)
+            xi, yi, xf, yf = line
+            return (yf - yi) * (xf - x) - (xf - xi) * (yf - y)
+
+        def add_shallow_bump(view, x, y):
+            shallow = view[0]
+            shallow[2:] = x, y
+            view[2] = (x, y, view[2])
+            bump = view[3]
+            while bump:
+                if slope(shallow, bump[0], bump[1]) < 0:
+                    shallow[:2] = bump[0], bump[1]
+                bump = bump[2]
+
+        def add_steep_bump(view, x, y):
+            steep = view[1]
+            steep[2:] = x, y
+            view[3] = (x, y, view[3])
+            bump = view[2]
+            while bump:
+                if slope(steep, bump[0], bump[1]) > 0:
+                    steep[:2] = bump[0], bump[1]
+                bump = bump[2]
+
+        def check_view(index):
+            """Drop a view that has closed to a line through a source corner; returns False if dropped"""
+            shallow, steep = views[index][0], views[index][1]
+            if (slope(shallow, steep[0], steep[1]) == 0 and slope(shallow, steep[2], steep[3]) == 0
+                    and (slope(shallow, 0, 1) == 0 or slope(shallow, 1, 0) == 0)):
+                del views[index]
+                return False
+            return True
+
+        # [shallow line, steep line, shallow bumps, steep bumps]; bumps are (x, y, parent) chains
+        views = [[[0, 1, r, 0], [1, 0, 0, r], None, None]]
+        for i in range(1, 2 * r + 1):
+            for j in range(max(0, i - r), min(i, r) + 1):
+                if not views:
+                    return
+                x, y = i - j, j
+                # Views are ordered shallow to steep; find the first the cell reaches into
+                index = 0
+                while index < len(views) and slope(views[index][1], x + 1, y) >= 0:
+                    index += 1
+                if index == len(views) or slope(views[index][0], x, y + 1) <= 0:
+                    continue
+                map_x, map_y = cx + x * sx, cy + y * sy
+                if 0 <= map_x < map_w and 0 <= map_y < map_h:
+                    row[(y * sy + r) * side + x * sx + r] = 1
+                    if not solid[map_y * map_w + map_x]:
+                        continue
+                view = views[index]
+                below_shallow = slope(view[0], x + 1, y) < 0
+                above_steep = slope(view[1], x, y + 1) > 0
+                if below_shallow and above_steep:
+                    del views[index]  # The cell spans the whole view
+                elif below_shallow:
+                    add_shallow_bump(view, x, y + 1)
+                    check_view(index)
+                elif above_steep:
+                    add_steep_bump(view, x + 1, y)
+                    check_view(index)
+                else:
+                    # The cell sits inside the view: split it into the lines passing either side
+                    views.insert(index, [list(view[0]), list(view[1]), view[2], view[3]])
+                    steep_index = index + 1
+                    add_steep_bump(views[index], x + 1, y)
+                    if not check_view(index):
+                        steep_index -= 1
+                    add_shallow_bump(views[steep_index], x, y + 1)
+                    check_view(steep_index)
+
+GHOST_CONTACT_DIST = 0.5  # Player takes damage from every ghost this close
+GHOST_FRICTION = 0.97
+
+class GhostSwarm:
+    """Ghost state as parallel arrays (struct of arrays), moved as one batch per tick.
+
+    Index i of x, y, vx, vy, kind and enabled is one ghost. NumPy arrays when
+    available; otherwise array/bytearray columns walked one ghost at a time.
+    """
+
+    def __init__(self, use_numpy=None):
+        self.use_numpy = np is not None if use_numpy is None else use_numpy
+        self.np_rng = None  # Seeded from the game rng on the first batch update
+        self.updates = 0  # Ghost updates performed, for the throughput metric
+        self.update_time = 0.0
+        if self.use_numpy:
+            self.x, self.y = np.zeros(0), np.zeros(0)
+            self.vx, self.vy = np.zeros(0), np.zeros(0)
+            self.kind = np.zeros(0, np.uint8)
+            self.enabled = np.zeros(0, bool)
+            # Flow step -> velocity nudge; FLOW_NONE maps to no nudge
+            self.flow_dx = np.array([dx for dx, dy in FLOW_VECTORS] + [0.0])
+            self.flow_dy = np.array([dy for dx, dy in FLOW_VECTORS] + [0.0])
+        else:
+            self.x, self.y = array('d'), array('d')
+            self.vx, self.vy = array('d'), array('d')
+            self.kind = bytearray()
+            self.enabled = bytearray()
+
+    def __len__(self):
+        return len(self.x)
+
+    @property
+    def updates_per_second(self):
+        return self.updates / self.update_time if self.update_time > 0 else 0.0
+
+    def add(self, positions, kinds):
+        """Append one enabled, resting ghost per (x, y) position"""
+        xs = [x for x, y in positions]
+        ys = [y for x, y in positions]
+        if self.use_numpy:
+            self.x = np.concatenate((self.x, xs))
+            self.y = np.concatenate((self.y, ys))
+            self.vx = np.concatenate((self.vx, np.zeros(len(xs))))
+            self.vy = np.concatenate((self.vy, np.zeros(len(xs))))
+            self.kind = np.concatenate((self.kind, np.array(kinds, np.uint8)))
+            self.enabled = np.concatenate((self.enabled, np.ones(len(xs), bool)))
+        else:
+            self.x.extend(xs)
+            self.y.extend(ys)
+            self.vx.extend([0.0] * len(xs))
+            self.vy.extend([0.0] * len(xs))
+            self.kind.extend(kinds)
+            self.enabled.extend([1] * len(xs))
+
+    def spawn(self, rng, walkable, map_w, count, avoid, min_dist=4.0):
+        """Scatter count ghosts of random types over walkable cells at least min_dist from avoid"""
+        ax, ay = avoid
+        cells = [cell for cell, free in enumerate(walkable)
+                 if free and math.hypot(cell % map_w + 0.5 - ax, cell // map_w + 0.5 - ay) >= min_dist]
+        if not cells:
+            raise ValueError("no free cells to spawn ghosts in")
+        positions, kinds = [], []
+        for _ in range(count):
+            cell = rng.choice(cells)
+            positions.append((cell % map_w + rng.uniform(0.2, 0.8), cell // map_w + rng.uniform(0.2, 0.8)))
+            kinds.append(rng.randint(0, 3))
+        self.add(positions, kinds)
+
+    def sees_player(self, visibility, px, py):
+        """Per ghost: can the player's cell see the ghost's cell.
+
+        Queried from the player's side so one PVS row serves every ghost; the PVS
+        is not exactly symmetric, so this is a close stand-in for the ghost's view.
+        """
+        if self.use_numpy:
+            return visibility.mask(px, py, self.x, self.y)
+        return bytearray(visibility.sees(px, py, x, y) for x, y in zip(self.x, self.y))
+
+    def update(self, rng, flow_dir, walkable, map_w, map_h, seeing):
+        """Steer every enabled ghost along the flow field, then move, bounce off walls and slow down.
+
+        seeing flags the ghosts in the player's line of sight (from sees_player).
+        """
+        started = time.perf_counter()
+        if self.use_numpy:
+            moved = self.update_numpy(rng, flow_dir, walkable, map_w, map_h, seeing)
+        else:
+            moved = self.update_python(rng, flow_dir, walkable, map_w, map_h, seeing)
+        self.updates += moved
+        self.update_time += time.perf_counter() - started
+
+    def update_numpy(self, rng, flow_dir, walkable, map_w, map_h, seeing):
+        live = np.flatnonzero(self.enabled)
+        count = len(live)
+        if not count:
+            return 0
+        if self.np_rng is None:
+            self.np_rng = np.random.default_rng(rng.getrandbits(64))
+        gen = self.np_rng
+        x, y, vx, vy = self.x[live], self.y[live], self.vx[live], self.vy[live]
+        
+        # Pathfinding AI - follow the flow field toward the player
+        ex, ey = x.astype(np.intp), y.astype(np.intp)
+        inside = (ex >= 0) & (ex < map_w) & (ey >= 0) & (ey < map_h)
+        step = np.full(count, FLOW_NONE, np.uint8)
+        step[inside] = np.frombuffer(flow_dir, np.uint8)[ey[inside] * map_w + ex[inside]]
+        
+        # Yellow ghosts sometimes wander off in a random direction, unless they can see the player
+        quirk = (self.kind[live] == 3) & ~seeing[live] & (gen.integers(0, 8, count) == 0)
+        step[quirk] = gen.integers(0, 8, np.count_nonzero(quirk))
+        vx += 0.001 * self.flow_dx[step]
+        vy += 0.001 * self.flow_dy[step]
+        
+        # Random movement occasionally
+        jitter = gen.integers(0, 16, count) == 0
+        jitters = np.count_nonzero(jitter)
+        vx[jitter] += 0.01 * (gen.integers(0, 3, jitters) - 1)
+        vy[jitter] += 0.01 * (gen.integers(0, 3, jitters) - 1)
+        
+        # Move where the target cell is open, bounce back otherwise
+        nx, ny = x + vx, y + vy
+        ok = (nx > 0) & (nx < map_w - 1) & (ny > 0) & (ny < map_h - 1)
+        cell = np.where(ok, ny.astype(np.intp) * map_w + nx.astype(np.intp), 0)
+        ok &= np.frombuffer(walkable, np.uint8)[cell] != 0
+        self.x[live] = np.where(ok, nx, x)
+        self.y[live] = np.where(ok, ny, y)
+        self.vx[live] = np.where(ok, vx, -vx) * GHOST_FRICTION
+        self.vy[live] = np.where(ok, vy, -vy) * GHOST_FRICTION
+        return count
+
+    def update_python(self, rng, flow_dir, walkable, map_w, map_h, seeing):
+        xs, ys, vxs, vys, kinds = self.x, self.y, self.vx, self.vy, self.kind
+        moved = 0
+        for i, enabled in enumerate(self.enabled):
+            if not enabled:
+                continue
+            moved += 1
+            x, y, vx, vy = xs[i], ys[i], vxs[i], vys[i]
+            
+            ex, ey = int(x), int(y)
+            step = FLOW_NONE
+            if 0 <= ex < map_w and 0 <= ey < map_h:
+                step = flow_dir[ey * map_w + ex]
+            if kinds[i] == 3 and not seeing[i] and rng.randint(0, 7) == 0:  # Yellow ghost randomness
+                step = rng.randint(0, 7)
+            if step != FLOW_NONE:
+                dx, dy = FLOW_VECTORS[step]
+                vx += 0.001 * dx
+                vy += 0.001 * dy
+            if rng.randint(0, 15) == 0:
+                vx += 0.01 * (rng.randint(0, 2) - 1)
+                vy += 0.01 * (rng.randint(0, 2) - 1)
+            
+            nx, ny = x + vx, y + vy
+            if 0 < nx < map_w - 1 and 0 < ny < map_h - 1 and walkable[int(ny) * map_w + int(nx)]:
+                xs[i], ys[i] = nx, ny
+            else:
+                vx, vy = -vx, -vy
+            vxs[i], vys[i] = vx * GHOST_FRICTION, vy * GHOST_FRICTION
+        return moved
+
+    def contacts(self, px, py):
+        """Number of enabled ghosts touching the player at (px, py)"""
+        reach = GHOST_CONTACT_DIST * GHOST_CONTACT_DIST
+        if self.use_numpy:
+            dx, dy = self.x - px, self.y - py
+            return int(np.count_nonzero((dx * dx + dy * dy < reach) & self.enabled))
+        hits = 0
+        for x, y, enabled in zip(self.x, self.y, self.enabled):
+            if enabled and (x - px) * (x - px) + (y - py) * (y - py) < reach:
+                hits += 1
+        return hits
+
+    def positions(self, box=None):
+        """(x, y, kind) of every enabled ghost, or only those inside box = (x0, y0, x1, y1)"""
+        if self.use_numpy:
+            live = self.enabled
+            if box is not None:
+                x0, y0, x1, y1 = box
+                live = live & (self.x >= x0) & (self.x < x1) & (self.y >= y0) & (self.y < y1)
+            return zip(self.x[live].tolist(), self.y[live].tolist(), self.kind[live].tolist())
+        x0, y0, x1, y1 = box or (-math.inf, -math.inf, math.inf, math.inf)
+        return [(x, y, kind) for x, y, kind, enabled in zip(self.x, self.y, self.kind, self.enabled)
+                if enabled and x0 <= x < x1 and y0 <= y < y1]
+
+    def in_view(self, px, py, angle, fov, max_dist, visibility):
+        """(x, y, kind) of enabled ghosts in cells visible from (px, py), inside the view cone and draw distance"""
+        if not self.use_numpy:
+            return [(x, y, kind) for x, y, kind in self.positions() if visibility.sees(px, py, x, y)]
+        live = self.enabled & visibility.mask(px, py, self.x, self.y)
+        dx, dy = self.x - px, self.y - py
+        angle_diff = (np.arctan2(dx, dy) - angle + math.pi) % (2 * math.pi) - math.pi
+        live &= (np.abs(angle_diff) <= fov / 2) & (dx * dx + dy * dy <= max_dist * max_dist)
+        return zip(self.x[live].tolist(), self.y[live].tolist(), self.kind[live].tolist())
+
+class Big3D:
+    def __init__(self, seed=None, screen_size=None, out=None, profiler=None, fps_cap=60, swarm=0, level=None,
+                 render_workers=0):
         self.x, self.y, self.z, self.angle, self.pitch = 1.5, 1.5, 0, 0, 0
         self.z_velocity = 0
-        self.width, self.height = self.get_screen_size()
-        self.enemies = []
+        self.rng = random.Random(seed)
+        self.fps_cap = fps_cap  # Render frames per second limit (0 = uncapped)
+        self.out = out or sys.stdout
+        self.fixed_screen_size = screen_size  # (cols, rows) - skips the terminal query
+        self.profiler = profiler or StageProfiler()
+        self.show_hud = False
+        # Fixed sizes never change; real terminals are watched for SIGWINCH
+        self.screen = ResizeWatcher(self.get_screen_size, listen=not screen_size)
+        self.width, self.height = self.screen.size
+        self.allocated_size = None  # Size the per-resolution buffers were last built for
+        self.ghosts = GhostSwarm()
         self.mouse_sensitivity = 0.003
         self.hp = 100
         self.damage_timer = 0
         self.game_over = False
         self.game_won = False
         self.health_pickups = []
-        self.start_time = time.time()
+        self.pickup_chunks = {}  # (chunk x, chunk y) -> pickups inside it
+        self.sim_time = 0.0  # Seconds of simulated time, advanced by update()
         self.gate_open = False
-        self.gate_x, self.gate_y = 18.5, 20.5
-        self.init_mouse()
-        self.map = [
-            "######################",
-            "#..AAA......AAA.....##",
-            "#..AAA......AAA.....##",
-            "#...................##",
-            "#.CCCC.BB....CCCC.BB##",
-            "#.CCCC.BB....CCCC.BB##",
-            "#...................##",
-            "#..EEE......EEE.....##",
-            "#..EEE......EEE.....##",
-            "#...................##",
-            "##.................###",
-            "##.AAAA.......AAAA.###",
-            "##.AAAA.......AAAA.###",
-            "##.................###",
-            "##.BBB.CCC.DDD.EEE.###",
-            "##.BBB.CCC.DDD.EEE.###",
-            "##.................###",
-            "##.................###",
-            "##.AAA.BBB.CCC.DDD.###",
-            "##.AAA.BBB.CCC.DDD.###",
-            "##.................###",
-            "######################"
-        ]
-        self.screen = None
+        self.level = level or GameMap.parse(DEFAULT_LEVEL)
+        self.x, self.y = self.level.start
+        self.gate_x, self.gate_y = self.level.gate or (-1.0, -1.0)
+        self.frame = FrameBuffer()  # Reused every frame, reallocated on resize
+        self.output = FrameEncoder()
+        self.writer = None  # FrameWriter when output goes through the background thread
+        self.recorder = None  # SessionRecorder teeing every rendered frame to a file
         self.frame_count = 0
         self.textures = self.generate_textures()
         self.sprites = self.generate_sprites()
-        self.depth_map = [[0 for _ in range(self.height)] for _ in range(self.width)]
-        self.path_map = [[0 for _ in range(len(self.map[0]))] for _ in range(len(self.map))]
+        self.baked_key = None
+        self.bake_assets()
+        self.wall_depth = array('d')  # Wall distance per screen column (z-buffer)
+        self.walkable = self.level.walkable
+        self.flow_origin = None  # (player cell, level version) the flow field was built from
+        self.flow_dir = bytearray()
+        self.flow_cells = []  # Cells the last search wrote into flow_dir, reset before the next one
+        # Steps the flow field reaches (None = whole level); ghosts beyond it wander
+        self.flow_radius = FLOW_RADIUS if self.level.width * self.level.height > FLOW_FULL_CELLS else None
+        self.max_view_dist = 12.0  # Rays stop (and fog starts) at this distance
+        self.full_view_dist = self.max_view_dist
+        self.column_step = 1  # Cast every Nth screen column and widen it
+        self.sprite_step = 1  # Sample every Nth sprite column
+        self.quality = None  # QualityController adjusting the three above to a frame-time budget
+        self.visibility = Visibility(self.level, int(self.max_view_dist) + 1)
+        self.use_numpy = np is not None  # Batched whole-frame wall pass
+        self.np_map = self.np_solid = None  # Views of the level grid for the batched ray caster
+        self.np_cell_lut = None
         
         # Scary lighting system
         self.light_global = 0.005  # Much darker
@@ -59,45 +1734,41 @@ class Big3D:
         self.battery = 1.0
         self.torch_enabled = True
         self.torch_flicker = 1.0
-        self.flashlight_coeff = self.calculate_flashlight_coeff()
+        self.lighting = Lighting()
+        self.backdrop = Backdrop()  # Cached ceiling / floor layers
+        self.minimap = Minimap()
+        self.post_passes = {
+            'vignette': VignettePass(),
+            'damage': TintPass("91"),  # Everything red
+            'game_over': BannerPass(GAME_OVER_BANNER, "1;91"),
+            'win': BannerPass(WIN_BANNER, "1;97"),
+        }
+        self.np_light_values = None
+        
+        # Wall pass on a process pool (0 = draw walls in this process)
+        self.band_renderer = BandRenderer(self, render_workers) if render_workers else None
         
         self.init_enemies()
+        if swarm:
+            self.ghosts.spawn(self.rng, self.walkable, self.level.width, swarm, (self.x, self.y))
         self.init_health_pickups()
 
-    def init_mouse(self):
-        try:
-            user32 = ctypes.windll.user32
-            point = wintypes.POINT()
-            user32.GetCursorPos(ctypes.byref(point))
-            self.last_x, self.last_y = point.x, point.y
-        except:
-            self.last_x, self.last_y = 0, 0
-
-    def handle_mouse(self):
-        try:
-            user32 = ctypes.windll.user32
-            point = wintypes.POINT()
-            user32.GetCursorPos(ctypes.byref(point))
-            
-            dx = point.x - self.last_x
-            dy = point.y - self.last_y
-            
-            if abs(dx) > 0 or abs(dy) > 0:
-                self.angle += dx * self.mouse_sensitivity
-                self.pitch = max(-1.2, min(1.2, self.pitch - dy * self.mouse_sensitivity * 0.3))
-                self.last_x, self.last_y = point.x, point.y
-        except:
-            pass
+    def look(self, dx, dy):
+        self.angle += dx * self.mouse_sensitivity
+        self.pitch = max(-1.2, min(1.2, self.pitch - dy * self.mouse_sensitivity * 0.3))
 
     def get_screen_size(self):
+        if self.fixed_screen_size:
+            return self.fixed_screen_size
         try:
             size = os.get_terminal_size()
-            return size.columns, size.lines - 1
+            if size.columns > 0 and size.lines > 1:
+                return size.columns, size.lines - 1
         except:
-            return 80, 24
+            pass
+        return 80, 24
 
     def generate_textures(self):
-        import random
         textures = {}
         char_grad = " .-,=+*#%@"
         
@@ -112,14 +1783,14 @@ class Big3D:
                 for x in range(32):
                     # Brick pattern detection
                     is_mortar = (y % 6 == 0) or ((x + 4 * (y // 6)) % 16 == 0)
-                    char_val = 12 - 8 * is_mortar + random.randint(0, 1)
+                    char_val = 12 - 8 * is_mortar + self.rng.randint(0, 1)
                     
                     if is_mortar:
                         # Mortar lines - use gray/white colors
-                        color = random.choice(mortar_colors)
+                        color = self.rng.choice(mortar_colors)
                     else:
                         # Brick areas - use varied brick colors
-                        color = random.choice(brick_colors)
+                        color = self.rng.choice(brick_colors)
                     
                     char_val = max(0, min(9, char_val))
                     char = char_grad[char_val]
@@ -216,272 +1887,385 @@ class Big3D:
         sprites['gate'] = sprite
         return sprites
 
+    def bake_assets(self):
+        """Pre-style every texture and sprite texel for each lighting level.
+
+        Drawing then becomes a table lookup. Re-bakes only when the texture or
+        sprite sets are replaced.
+        """
+        key = (id(self.textures), id(self.sprites))
+        if key == self.baked_key:
+            return
+        self.baked_key = key
+        self.baked_textures = {wall_type: [[bake_texel(char, color) for char, color in row] for row in texture]
+                               for wall_type, texture in self.textures.items()}
+        self.baked_fallback = [[bake_texel('#', 37)] * 32 for _ in range(32)]
+        self.baked_sprites = {sprite_type: [[bake_texel(char, color) if alpha > 0 else None
+                                             for char, color, alpha in row] for row in sprite]
+                              for sprite_type, sprite in self.sprites.items()}
+        self.np_cell_lut = None
+        self.scaled_sprites = {}  # (sprite type, size) -> pre-scaled columns
+
     def init_enemies(self):
-        # Add four ghosts like in Pac-Man
-        ghost_positions = [(2.5, 2.5), (7.5, 2.5), (2.5, 7.5), (7.5, 7.5)]
-        
-        for i in range(4):
-            x, y = ghost_positions[i]
-            enemy = {
-                'x': x, 'y': y, 'z': 0,
-                'vx': 0, 'vy': 0, 'vz': 0,
-                'type': i, 'enabled': True
-            }
-            self.enemies.append(enemy)
+        # Ghosts at the level's spawn points (four, like in Pac-Man)
+        spawns = self.level.ghost_spawns
+        self.ghosts.add([(x, y) for x, y, kind in spawns], [kind for x, y, kind in spawns])
     
     def init_health_pickups(self):
         # Place health pickups at specific locations
-        pickup_positions = [(3.5, 3.5), (10.5, 3.5), (3.5, 10.5), (10.5, 10.5)]
-        for x, y in pickup_positions:
-            if self.map[int(y)][int(x)] == '.':
-                self.health_pickups.append({'x': x, 'y': y, 'active': True})
-                print(f"Health pickup at {x}, {y}")
+        for x, y in self.level.pickups:
+            if self.level.is_open(x, y):
+                pickup = {'x': x, 'y': y, 'active': True}
+                self.health_pickups.append(pickup)
+                self.pickup_chunks.setdefault((int(x) // PICKUP_CHUNK, int(y) // PICKUP_CHUNK), []).append(pickup)
+
+    def nearby_pickups(self):
+        """Pickups in the 3x3 chunks around the player - everything within PICKUP_CHUNK cells"""
+        cx, cy = int(self.x) // PICKUP_CHUNK, int(self.y) // PICKUP_CHUNK
+        for chunk_y in (cy - 1, cy, cy + 1):
+            for chunk_x in (cx - 1, cx, cx + 1):
+                yield from self.pickup_chunks.get((chunk_x, chunk_y), ())
+
+    def pickups_in(self, x0, y0, x1, y1):
+        """Pickups in every chunk overlapping the box (may include some just outside it)"""
+        for chunk_y in range(int(y0) // PICKUP_CHUNK, int(y1) // PICKUP_CHUNK + 1):
+            for chunk_x in range(int(x0) // PICKUP_CHUNK, int(x1) // PICKUP_CHUNK + 1):
+                yield from self.pickup_chunks.get((chunk_x, chunk_y), ())
 
     def update_pathfinding(self):
-        # Clear path map
-        for x in range(len(self.map)):
-            for y in range(len(self.map[0])):
-                self.path_map[x][y] = 0
-        
-        # Set player position to highest value
+        """Breadth-first flow field from the player's cell, rebuilt only when that cell or the level changes"""
         px, py = int(self.x), int(self.y)
-        if 0 <= px < len(self.map) and 0 <= py < len(self.map[0]):
-            self.path_map[px][py] = len(self.map)
-        
-        # Propagate values outward from player
-        for i in range(len(self.map), 0, -1):
-            for x in range(1, len(self.map) - 1):
-                for y in range(1, len(self.map[0]) - 1):
-                    if self.path_map[x][y] == i:
-                        # Set neighboring empty tiles to i-1
-                        for dx, dy in [(1,0), (-1,0), (0,1), (0,-1)]:
-                            nx, ny = x + dx, y + dy
-                            if (self.path_map[nx][ny] == 0 and 
-                                self.map[nx][ny] == '.'):
-                                self.path_map[nx][ny] = i - 1
+        origin = (px, py, self.level.version)  # A tile change reroutes ghosts too
+        if origin == self.flow_origin:
+            return
+        self.flow_origin = origin
+        
+        map_w, map_h = self.level.width, self.level.height
+        walkable = self.walkable
+        flow = self.flow_dir
+        if len(flow) == map_w * map_h:
+            for cell in self.flow_cells:
+                flow[cell] = FLOW_NONE
+        else:
+            flow = self.flow_dir = bytearray([FLOW_NONE]) * (map_w * map_h)
+        visited = self.flow_cells = []
+        if not (0 <= px < map_w and 0 <= py < map_h):
+            return
+        
+        start = py * map_w + px
+        # Expand one ring of steps at a time so an opt-in radius needs no distance array;
+        # a cell has been reached once its direction is set
+        frontier = [start]
+        steps_left = self.flow_radius
+        while frontier and steps_left != 0:
+            if steps_left is not None:
+                steps_left -= 1
+            next_frontier = []
+            for cell in frontier:
+                cx, cy = cell % map_w, cell // map_w
+                for step, (dx, dy) in enumerate(FLOW_STEPS):
+                    nx, ny = cx + dx, cy + dy
+                    if not (0 <= nx < map_w and 0 <= ny < map_h):
+                        continue
+                    neighbor = ny * map_w + nx
+                    if flow[neighbor] != FLOW_NONE or neighbor == start or not walkable[neighbor]:
+                        continue
+                    # No cutting diagonally past a wall corner
+                    if dx and dy and not (walkable[cy * map_w + nx] and walkable[ny * map_w + cx]):
+                        continue
+                    flow[neighbor] = (step + 4) % 8  # Points back toward the player
+                    next_frontier.append(neighbor)
+            visited += next_frontier
+            frontier = next_frontier
 
     def update_enemies(self):
-        import random
-        import math
-        
         self.update_pathfinding()
-        
-        for enemy in self.enemies:
-            if not enemy['enabled']:
-                continue
-            
-            # Pathfinding AI - move toward highest nearby value
-            max_rating = 0
-            best_dir = 0
-            
-            for direction in range(8):
-                angle = direction * math.pi / 4
-                nx = enemy['x'] + 1.4 * math.cos(angle)
-                ny = enemy['y'] + 1.4 * math.sin(angle)
-                
-                if (0 <= int(nx) < len(self.map) and 
-                    0 <= int(ny) < len(self.map[0]) and
-                    self.map[int(nx)][int(ny)] == '.'):
-                    rating = self.path_map[int(nx)][int(ny)]
-                    
-                    # Add ghost personality quirks
-                    if enemy['type'] == 3 and random.randint(0, 7) == 0:  # Yellow ghost randomness
-                        rating += random.randint(0, 2)
-                    
-                    if rating > max_rating:
-                        max_rating = rating
-                        best_dir = direction
-            
-            # Move in best direction
-            if max_rating > 0:
-                nx = math.cos(best_dir * math.pi / 4)
-                ny = math.sin(best_dir * math.pi / 4)
-                enemy['vx'] += 0.001 * nx
-                enemy['vy'] += 0.001 * ny
-            
-            # Random movement occasionally
-            if random.randint(0, 15) == 0:
-                enemy['vx'] += 0.01 * (random.randint(0, 2) - 1)
-                enemy['vy'] += 0.01 * (random.randint(0, 2) - 1)
-            
-            # Update position with collision
-            new_x = enemy['x'] + enemy['vx']
-            new_y = enemy['y'] + enemy['vy']
-            
-            if (0 < new_x < len(self.map[0]) - 1 and 
-                0 < new_y < len(self.map) - 1 and
-                self.map[int(new_y)][int(new_x)] == '.'):
-                enemy['x'] = new_x
-                enemy['y'] = new_y
-            else:
-                enemy['vx'] = -enemy['vx']
-                enemy['vy'] = -enemy['vy']
-            
-            # Apply friction
-            enemy['vx'] *= 0.97
-            enemy['vy'] *= 0.97
+        ghosts = self.ghosts
+        seeing = ghosts.sees_player(self.visibility, self.x, self.y)
+        ghosts.update(self.rng, self.flow_dir, self.walkable, self.level.width, self.level.height, seeing)
 
     def cast_ray(self, angle):
-        x, y = self.x, self.y
-        dx, dy = math.sin(angle) * 0.01, math.cos(angle) * 0.01
-        dist = 0
-        hit_vertical = False
-        while dist < 12:
-            prev_x, prev_y = x, y
-            x += dx
-            y += dy
-            dist += 0.01
-            grid_x, grid_y = int(x), int(y)
-            if grid_y < 0 or grid_y >= len(self.map) or grid_x < 0 or grid_x >= len(self.map[0]):
-                return dist, '#', grid_x, grid_y, 0, hit_vertical
-            cell = self.map[grid_y][grid_x]
-            if cell != '.' and cell != ' ':
-                # Calculate texture coordinate
-                if abs(x - prev_x) > abs(y - prev_y):
-                    tex_coord = int((y % 1) * 32)
-                    hit_vertical = True
+        """Step the ray cell to cell (DDA) until it hits a wall or max_view_dist"""
+        ray_dx, ray_dy = math.sin(angle), math.cos(angle)
+        map_x, map_y = int(self.x), int(self.y)
+        max_dist = self.max_view_dist
+        
+        # Ray length needed to cross one whole cell in x / y
+        delta_x = abs(1.0 / ray_dx) if ray_dx != 0 else float('inf')
+        delta_y = abs(1.0 / ray_dy) if ray_dy != 0 else float('inf')
+        
+        # Ray length to the first x / y grid line
+        if ray_dx < 0:
+            step_x, side_x = -1, (self.x - map_x) * delta_x
+        else:
+            step_x, side_x = 1, (map_x + 1.0 - self.x) * delta_x
+        if ray_dy < 0:
+            step_y, side_y = -1, (self.y - map_y) * delta_y
+        else:
+            step_y, side_y = 1, (map_y + 1.0 - self.y) * delta_y
+        
+        map_w, map_h = self.level.width, self.level.height
+        tiles, solid = self.level.tiles, self.level.solid
+        while True:
+            # Advance to whichever grid line is closer
+            if side_x < side_y:
+                dist = side_x
+                side_x += delta_x
+                map_x += step_x
+                hit_vertical = True
+            else:
+                dist = side_y
+                side_y += delta_y
+                map_y += step_y
+                hit_vertical = False
+            if dist >= max_dist:
+                return max_dist, '#', 0, 0, 0, False
+            if map_y < 0 or map_y >= map_h or map_x < 0 or map_x >= map_w:
+                return dist, '#', map_x, map_y, 0, hit_vertical
+            if solid[map_y * map_w + map_x]:
+                cell = chr(tiles[map_y * map_w + map_x])
+                # Exact texture coordinate from the hit point along the wall face
+                if hit_vertical:
+                    tex_coord = int(((self.y + dist * ray_dy) % 1) * 32)
                 else:
-                    tex_coord = int((x % 1) * 32)
-                    hit_vertical = False
-                return dist, cell, grid_x, grid_y, tex_coord, hit_vertical
-        return 12, '#', 0, 0, 0, False
+                    tex_coord = int(((self.x + dist * ray_dx) % 1) * 32)
+                return dist, cell, map_x, map_y, tex_coord, hit_vertical
+
+    def resize(self, width, height):
+        """Rebuild everything sized by the screen, once per real size change"""
+        self.width, self.height = width, height
+        self.allocated_size = (width, height)
+        self.lighting.resize(width, height, self.light_flashlight)
+        self.wall_depth = array('d', [self.max_view_dist]) * width
+        self.frame.resize(width, height)
+
+    def apply_quality(self):
+        quality = self.quality
+        self.column_step, self.sprite_step = quality.column_step, quality.sprite_step
+        self.max_view_dist = self.full_view_dist * quality.view_factor
 
     def render(self):
+        prof = self.profiler
+        t = prof.now()
         self.frame_count += 1
-        self.width, self.height = self.get_screen_size()
+        self.bake_assets()
+        size = self.screen.poll()
+        if size != self.allocated_size:
+            self.resize(*size)
         fov = math.pi / 4.0
-        screen = [[" " for _ in range(self.height)] for _ in range(self.width)]
+        self.lighting.update(self.battery, self.torch_enabled)
+        self.backdrop.update(self.lighting)
+        frame = self.frame
+        frame.resize(self.width, self.height)  # No-op unless the writer handed back an old-size spare
+
+        # Render walls and floor/ceiling (also fills the column z-buffer)
+        if self.band_renderer is not None:
+            self.band_renderer.render(self, fov)
+        elif self.use_numpy:
+            self.render_walls_numpy(fov)
+        else:
+            self.render_walls(fov)
+        t = prof.lap('walls', t)
+
+        # Render sprites (enemies, health pickups, and gate)
+        self.draw_sprites(frame, fov)
+        t = prof.lap('sprites', t)
+        
+        # Draw minimap
+        self.draw_minimap(frame)
+        t = prof.lap('minimap', t)
+        
+        # Post-processing: low-HP vignette, damage tint, then the end banners
+        passes = self.post_passes
+        if self.hp <= LOW_HP:
+            passes['vignette'].apply(frame)
+        if self.damage_timer > 0:
+            passes['damage'].apply(frame)
+        if self.game_over:
+            passes['game_over'].apply(frame)
+        if self.game_won:
+            passes['win'].apply(frame)
+        if self.show_hud:
+            # Own row at the bottom of the view - the status line stays within the screen width
+            hud = prof.hud_text[:frame.width].ljust(frame.width)
+            frame.blit(0, frame.height - 1, frame.width, array('H', [ord(char) | HUD_STYLE for char in hud]))
+        t = prof.lap('overlays', t)
+
+        elapsed = self.sim_time
+        gate_status = "OPEN" if self.gate_open else f"Opens in {max(0, 120-int(elapsed))}s"
+        status = f"HP: {self.hp} | Time: {int(elapsed)}s | Gate: {gate_status} | Battery: {int(self.battery*100)}% | WASD=move SPACE=jump EQ=look↕ F=flashlight X=quit"
+        if self.quality is not None:
+            status += f" | Scale {self.quality.scale:.0%}"
+        if self.recorder is not None:
+            self.recorder.record(frame, status)
+        if self.writer is not None:
+            # Encoding and the blocking write happen on the writer thread
+            self.frame = self.writer.submit(frame, status)
+            prof.lap('output', t)
+            return
+        text = self.output.encode(frame, status)
+        t = prof.lap('encode', t)
+        self.out.write(text)
+        self.out.flush()
+        prof.lap('output', t)
 
-        # Initialize depth map
-        self.depth_map = [[12.0 for _ in range(self.height)] for _ in range(self.width)]
+    def render_walls(self, fov, start=0, end=None):
+        """Walls, ceiling and floor for screen columns start..end (default: all).
+
+        Only every column_step-th column is cast and shaded; it is copied into the
+        columns after it.
+        """
+        cells, width = self.frame.cells, self.width
+        ceiling, floor = self.backdrop.ceiling, self.backdrop.floor
+        end = self.width if end is None else end
+        step = self.column_step
         
-        # Render walls and floor/ceiling
-        for col in range(self.width):
+        for col in range(start, end, step):
             ray_angle = self.angle - fov / 2.0 + (col / self.width) * fov
             dist, wall_type, grid_x, grid_y, tex_coord, hit_vertical = self.cast_ray(ray_angle)
             dist = max(dist, 0.1)
+            self.wall_depth[col] = dist
             height = min(int(self.height * 0.8 / dist), self.height)
             horizon = self.height // 2 + int(self.z * 2 + self.pitch * self.height * 0.3)
             wall_start = horizon - height // 2
             wall_end = horizon + height // 2
 
-            for row in range(self.height):
-                if row < wall_start:
-                    if row < self.height * 0.2:
-                        ceiling_char = '#' if (col + row) % 3 == 0 else '-'
-                        brightness = 0
-                        if self.torch_enabled:
-                            flashlight_idx = col + row * self.width
-                            if flashlight_idx < len(self.flashlight_coeff):
-                                brightness = self.battery * self.light_flashlight * self.flashlight_coeff[flashlight_idx] * 0.1
-                        brightness = max(0, min(90, brightness))
-                        if brightness > 20: intensity = "34"
-                        elif brightness > 5: intensity = "2;34"
-                        else: intensity = "2;30"
-                        screen[col][row] = f"\033[{intensity}m{ceiling_char}\033[0m"
-                    else:
-                        sky_char = '#' if (col + row) % 3 == 0 else '-'
-                        brightness = 0
-                        if self.torch_enabled:
-                            flashlight_idx = col + row * self.width
-                            if flashlight_idx < len(self.flashlight_coeff):
-                                brightness = self.battery * self.light_flashlight * self.flashlight_coeff[flashlight_idx] * 0.1
-                        brightness = max(0, min(90, brightness))
-                        if brightness > 20: intensity = "34"
-                        elif brightness > 5: intensity = "2;34"
-                        else: intensity = "2;30"
-                        screen[col][row] = f"\033[{intensity}m{sky_char}\033[0m"
-                elif row > wall_end:
-                    floor_char = '_' if row > self.height * 0.8 else ','
-                    brightness = 0
-                    if self.torch_enabled:
-                        flashlight_idx = col + row * self.width
-                        if flashlight_idx < len(self.flashlight_coeff):
-                            brightness = self.battery * self.light_flashlight * self.flashlight_coeff[flashlight_idx] * 0.1
-                    brightness = max(0, min(90, brightness))
-                    if brightness > 20: intensity = "37"
-                    elif brightness > 5: intensity = "2;37"
-                    else: intensity = "2;30"
-                    screen[col][row] = f"\033[{intensity}m{floor_char}\033[0m"
-                else:
-                    screen[col][row] = self.get_textured_wall_char(col, row, dist, wall_type, tex_coord, hit_vertical, wall_start, wall_end, height)
-                
-                # Update depth map for sprite rendering
-                if wall_start <= row <= wall_end:
-                    self.depth_map[col][row] = dist
+            # Ceiling and floor are copied from the cached layers, column slice by column slice
+            top = min(max(wall_start, 0), self.height)
+            bottom = min(max(wall_end + 1, top), self.height)
+            if top:
+                cells[col:col + top * width:width] = ceiling[col:col + top * width:width]
+            if bottom < self.height:
+                cells[col + bottom * width::width] = floor[col + bottom * width::width]
+            for row in range(top, bottom):
+                cells[col + row * width] = self.get_textured_wall_char(col, row, dist, wall_type, tex_coord, hit_vertical, wall_start, wall_end, height)
+            for copy in range(col + 1, min(col + step, end)):
+                cells[copy::width] = cells[col::width]
+                self.wall_depth[copy] = dist
 
-        # Render sprites (enemies, health pickups, and gate)
-        self.draw_enemies(screen, fov)
-        self.draw_health_pickups(screen, fov)
-        self.draw_gate(screen, fov)
-        
-        # Draw minimap
-        self.draw_minimap(screen)
-        
-        # Apply damage effect - turn all characters red
-        if self.damage_timer > 0:
-            for col in range(self.width):
-                for row in range(self.height):
-                    if '\033[' in screen[col][row]:
-                        char = screen[col][row].split('m')[1][0] if len(screen[col][row].split('m')) > 1 else screen[col][row][-1]
-                        screen[col][row] = f"\033[91m{char}\033[0m"
-                    else:
-                        screen[col][row] = f"\033[91m{screen[col][row]}\033[0m"
-        
-        # Draw game over overlay - bigger text
-        if self.game_over:
-            center_x, center_y = self.width // 2, self.height // 2
-            game_over_lines = [
-                "  ####    ###   #   # #####    ####  #   # ##### ####  ",
-                " #       #   #  ## ## #       #    #  # #  #     #   # ",
-                " #  ###  #####  # # # #####   #    #  # #  ##### ####  ",
-                " #    #  #   #  #   # #       #    #   #   #     #   # ",
-                "  ####   #   #  #   # #####    ####    #   ##### #   # "
-            ]
-            for line_idx, line in enumerate(game_over_lines):
-                y = center_y - 2 + line_idx
-                if 0 <= y < self.height:
-                    for char_idx, char in enumerate(line):
-                        x = center_x - len(line) // 2 + char_idx
-                        if 0 <= x < self.width:
-                            screen[x][y] = f"\033[1;91m{char}\033[0m"
-        
-        # Draw win overlay
-        if self.game_won:
-            center_x, center_y = self.width // 2, self.height // 2
-            win_lines = [
-                " #   #  ####  #   #   #   #  ####  #   # # ",
-                " #   # #    # #   #   #   # #    # ##  # # ",
-                " #   # #    # #   #   # # # #    # # # # # ",
-                " # # # #    # #   #   # # # #    # #  ## # ",
-                "  # #   ####   ###     # #   ####  #   # # "
-            ]
-            for line_idx, line in enumerate(win_lines):
-                y = center_y - 2 + line_idx
-                if 0 <= y < self.height:
-                    for char_idx, char in enumerate(line):
-                        x = center_x - len(line) // 2 + char_idx
-                        if 0 <= x < self.width:
-                            screen[x][y] = f"\033[1;97m{char}\033[0m"
-
-        frame = '\033[H'
-        for row in range(self.height):
-            frame += ''.join(screen[col][row] for col in range(self.width)) + '\n'
-        elapsed = time.time() - self.start_time
-        gate_status = "OPEN" if self.gate_open else f"Opens in {max(0, 120-int(elapsed))}s"
-        frame += f"HP: {self.hp} | Time: {int(elapsed)}s | Gate: {gate_status} | Battery: {int(self.battery*100)}% | WASD=move SPACE=jump EQ=look↕ F=flashlight X=quit"
-        print(frame, end='', flush=True)
+    def cast_rays_numpy(self, angles):
+        """Batched DDA - casts one ray per angle, same results as cast_ray"""
+        level = self.level
+        if self.np_map is None:
+            self.np_map = np.frombuffer(level.tiles, dtype=np.uint8).reshape(level.height, level.width)
+            self.np_solid = np.frombuffer(level.solid, dtype=np.uint8).reshape(level.height, level.width)
+        map_h, map_w = self.np_map.shape
+        max_dist = self.max_view_dist
+        count = len(angles)
 
-    def calculate_flashlight_coeff(self):
-        """Pre-calculate torch brightness coefficients"""
-        coeff = []
-        for y in range(self.height):
-            for x in range(self.width):
-                lghtx = 4.0 * (x - self.width/2) / self.width  # Tighter beam
-                lghty = 4.0 * (y - self.height/2) / self.height
-                lght = math.exp(-lghtx*lghtx) * math.exp(-lghty*lghty)
-                coeff.append(600.0 * lght * (1 + 0.3 * ((abs(y)%2) + (abs(x)%2))))
-        return coeff
+        ray_dx, ray_dy = np.sin(angles), np.cos(angles)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            delta_x = np.abs(1.0 / ray_dx)
+            delta_y = np.abs(1.0 / ray_dy)
+            map_x = np.full(count, int(self.x))
+            map_y = np.full(count, int(self.y))
+            step_x = np.where(ray_dx < 0, -1, 1)
+            step_y = np.where(ray_dy < 0, -1, 1)
+            side_x = np.where(ray_dx < 0, (self.x - map_x) * delta_x, (map_x + 1.0 - self.x) * delta_x)
+            side_y = np.where(ray_dy < 0, (self.y - map_y) * delta_y, (map_y + 1.0 - self.y) * delta_y)
+
+        dist = np.full(count, max_dist)
+        cells = np.full(count, ord('#'), dtype=np.uint8)
+        hit_vertical = np.zeros(count, dtype=bool)
+        tex_coord = np.zeros(count, dtype=np.int64)
+        active = np.arange(count)
+
+        # Every active ray crosses one grid line per pass
+        while len(active):
+            sx, sy = side_x[active], side_y[active]
+            vertical = sx < sy
+            d = np.where(vertical, sx, sy)
+            side_x[active] = np.where(vertical, sx + delta_x[active], sx)
+            side_y[active] = np.where(vertical, sy, sy + delta_y[active])
+            mx = map_x[active] + np.where(vertical, step_x[active], 0)
+            my = map_y[active] + np.where(vertical, 0, step_y[active])
+            map_x[active], map_y[active] = mx, my
+
+            too_far = d >= max_dist
+            outside = (mx < 0) | (mx >= map_w) | (my < 0) | (my >= map_h)
+            my_in, mx_in = np.clip(my, 0, map_h - 1), np.clip(mx, 0, map_w - 1)
+            cell = self.np_map[my_in, mx_in]
+            solid = self.np_solid[my_in, mx_in] != 0
+            hit = ~too_far & (outside | solid)
+
+            hit_rays = active[hit]
+            dist[hit_rays] = d[hit]
+            hit_vertical[hit_rays] = vertical[hit]
+            cells[hit_rays] = np.where(outside[hit], ord('#'), cell[hit])
+            hit_x = self.x + d[hit] * ray_dx[hit_rays]
+            hit_y = self.y + d[hit] * ray_dy[hit_rays]
+            coord = (np.where(vertical[hit], hit_y % 1, hit_x % 1) * 32).astype(np.int64)
+            tex_coord[hit_rays] = np.where(outside[hit], 0, coord)
+
+            # Rays past the view distance keep the max_dist defaults
+            active = active[~(hit | too_far)]
+
+        return dist, cells, tex_coord, hit_vertical
+
+    def build_numpy_cell_lut(self):
+        """Every cell code the wall pass can emit, indexed by (texture, texel, level) slots"""
+        wall_types = sorted(self.baked_textures)
+        cells = []
+        # Walls: (texture slot, tex_y, tex_x, level) - level 0..3 is bold, normal, dim, black
+        for texture in [self.baked_textures[t] for t in wall_types] + [self.baked_fallback]:
+            for tex_row in texture:
+                for texel in tex_row:
+                    cells.extend(texel)
+        lut = np.array(cells, dtype=np.uint16)
+        slots = np.full(256, len(wall_types), dtype=np.int64)
+        for i, wall_type in enumerate(wall_types):
+            slots[ord(wall_type)] = i
+        return lut, slots
+
+    def render_walls_numpy(self, fov, start=0, end=None):
+        if self.np_cell_lut is None:
+            self.np_cell_lut = self.build_numpy_cell_lut()
+        lut, slots = self.np_cell_lut
+        end = self.width if end is None else end
+        step = self.column_step
+        band = slice(start, end, step)  # Columns actually cast and shaded
+
+        cols = np.arange(start, end, step)
+        rows = np.arange(self.height)[None, :]
+        angles = self.angle - fov / 2.0 + (cols / self.width) * fov
+        dist, cells, tex_coord, hit_vertical = self.cast_rays_numpy(angles)
+        dist = np.maximum(dist, 0.1)
+        height = np.minimum((self.height * 0.8 / dist).astype(np.int64), self.height)
+        horizon = self.height // 2 + int(self.z * 2 + self.pitch * self.height * 0.3)
+        wall_start = (horizon - height // 2)[:, None]
+        wall_end = (horizon + height // 2)[:, None]
+
+        # Flashlight brightness laid out as [col][row]
+        if self.np_light_values is None:
+            self.np_light_values = np.array(self.lighting.values)
+        buckets = np.frombuffer(self.lighting.buckets, dtype=np.uint8).reshape(self.height, self.width)
+        flashlight = self.np_light_values[buckets[:, band].T]
+
+        # Walls
+        wall_pos = (rows - wall_start) / np.maximum(1, wall_end - wall_start)
+        tex_y = (wall_pos * 31).astype(np.int64) % 32
+        tex_x = (tex_coord % 32)[:, None]
+        facing = np.where(hit_vertical, 1.0, 0.7)[:, None]
+        brightness = np.clip(flashlight * (height / self.height * self.torch_flicker)[:, None] * facing, 0, 90)
+        level = np.select([brightness > 40, brightness > 15, brightness > 3], [0, 1, 2], 3)
+        cell_idx = slots[cells][:, None] * 4096 + tex_y * 128 + tex_x * 4 + level
+
+        # Ceiling / floor bands come from the cached backdrop layers
+        ceiling_layer = np.frombuffer(self.backdrop.ceiling, dtype=np.uint16).reshape(self.height, self.width)
+        floor_layer = np.frombuffer(self.backdrop.floor, dtype=np.uint16).reshape(self.height, self.width)
+        ceiling = rows < wall_start
+        floor = rows > wall_end
+        column_cells = np.where(ceiling, ceiling_layer[:, band].T,
+                                np.where(floor, floor_layer[:, band].T, lut[cell_idx]))
+        if step > 1:
+            # Widen every cast column over the ones skipped after it
+            column_cells = np.repeat(column_cells, step, axis=0)[:end - start]
+            dist = np.repeat(dist, step)[:end - start]
+
+        # Column z-buffer for sprite rendering
+        np.frombuffer(self.wall_depth, dtype=np.float64)[start:end] = dist
+        frame_view = np.frombuffer(self.frame.cells, dtype=np.uint16).reshape(self.height, self.width)
+        frame_view[:, start:end] = column_cells.T
 
     def get_textured_wall_char(self, col, row, dist, wall_type, tex_coord, hit_vertical, wall_start, wall_end, height):
         # Calculate texture Y coordinate
@@ -489,265 +2273,182 @@ class Big3D:
         tex_y = int(wall_pos * 31) % 32
         tex_x = tex_coord % 32
         
-        # Get texture character and color
-        if wall_type in self.textures:
-            char, color = self.textures[wall_type][tex_y][tex_x]
-        else:
-            char, color = '#', 37
+        texture = self.baked_textures.get(wall_type, self.baked_fallback)
         
         # Flashlight-only lighting system
         brightness = 0
         
-        # Only add flashlight if enabled
-        if self.torch_enabled:
-            flashlight_idx = col + row * self.width
-            if flashlight_idx < len(self.flashlight_coeff):
-                brightness = self.battery * self.light_flashlight * self.flashlight_coeff[flashlight_idx] * height / self.height * self.torch_flicker
-                # Wall normal lighting (vertical walls brighter)
-                if hit_vertical:
-                    brightness *= 1.0
-                else:
-                    brightness *= 0.7
+        # Only add flashlight if enabled (a dark lighting bucket when it is off)
+        light = self.lighting
+        brightness = light.values[light.buckets[col + row * self.width]] * height / self.height * self.torch_flicker
+        # Wall normal lighting (vertical walls brighter)
+        if hit_vertical:
+            brightness *= 1.0
+        else:
+            brightness *= 0.7
         
         # Apply brightness to character
         brightness = max(0, min(90, brightness))
         
         # Scarier color intensity - much darker thresholds
-        if brightness > 40: intensity = f"1;{color}"
-        elif brightness > 15: intensity = str(color)
-        elif brightness > 3: intensity = f"2;{color}"
-        else: intensity = "2;30"  # Almost black
+        if brightness > 40: level = BOLD
+        elif brightness > 15: level = NORMAL
+        elif brightness > 3: level = DIM
+        else: level = BLACK  # Almost black
         
-        return f"\033[{intensity}m{char}\033[0m"
+        return texture[tex_y][tex_x][level]
 
-    def draw_enemies(self, screen, fov):
-        for enemy in self.enemies:
-            if not enemy['enabled']:
-                continue
-            
-            # Calculate relative position to player
-            dx = enemy['x'] - self.x
-            dy = enemy['y'] - self.y
-            
-            # Calculate angle to enemy relative to player's view
-            enemy_angle = math.atan2(dx, dy)
-            angle_diff = enemy_angle - self.angle
-            
-            # Normalize angle difference to [-pi, pi]
-            while angle_diff > math.pi:
-                angle_diff -= 2 * math.pi
-            while angle_diff < -math.pi:
-                angle_diff += 2 * math.pi
-            
-            # Check if enemy is in field of view
-            if abs(angle_diff) > fov / 2:
-                continue
-            
-            # Calculate distance and screen position
-            distance = math.sqrt(dx * dx + dy * dy)
-            if distance < 0.1:
-                continue
-            
-            # Calculate screen column
-            screen_x = int(self.width / 2 + (angle_diff / fov) * self.width)
-            if screen_x < 0 or screen_x >= self.width:
-                continue
-            
-            # Calculate sprite size based on distance
-            sprite_size = max(1, int(self.height * 0.5 / distance))
-            if sprite_size > 64:  # Limit max size
-                continue
-            
-            # Calculate vertical position
-            horizon = self.height // 2 + int(self.z * 2 + self.pitch * self.height * 0.3)
-            sprite_y = horizon - sprite_size // 2
-            
-            # Draw sprite
-            self.draw_sprite(screen, screen_x, sprite_y, sprite_size, enemy['type'], distance)
+    def draw_sprites(self, frame, fov):
+        """Draw every visible billboard (ghosts, pickups, gate) back to front"""
+        horizon = self.height // 2 + int(self.z * 2 + self.pitch * self.height * 0.3)
+        billboards = []
+        # Sprites in cells the player's cell cannot see are skipped before any projection
+        sees = self.visibility.sees
+        for x, y, kind in self.ghosts.in_view(self.x, self.y, self.angle, fov, self.max_view_dist, self.visibility):
+            self.project_billboard(billboards, fov, horizon, x, y, kind, 0.5, 64, GHOST_LEVELS)
+        for pickup in self.nearby_pickups():
+            if pickup['active'] and sees(self.x, self.y, pickup['x'], pickup['y']):
+                self.project_billboard(billboards, fov, horizon, pickup['x'], pickup['y'], 'health', 0.3, 32, ITEM_LEVELS)
+        if self.gate_open and sees(self.x, self.y, self.gate_x, self.gate_y):
+            self.project_billboard(billboards, fov, horizon, self.gate_x, self.gate_y, 'gate', 0.6, 64, ITEM_LEVELS)
+        
+        # Painter's order - nearer sprites overwrite farther ones
+        billboards.sort(key=lambda billboard: -billboard[0])
+        for billboard in billboards:
+            self.draw_billboard(frame, *billboard)
 
-    def draw_sprite(self, screen, center_x, center_y, size, sprite_type, distance):
-        if sprite_type not in self.sprites:
+    def project_billboard(self, billboards, fov, horizon, x, y, sprite_type, scale, max_size, levels):
+        # Calculate relative position to player
+        dx = x - self.x
+        dy = y - self.y
+        
+        # Calculate angle relative to player's view, normalized to [-pi, pi]
+        angle_diff = (math.atan2(dx, dy) - self.angle + math.pi) % (2 * math.pi) - math.pi
+        
+        # Check if sprite is in field of view
+        if abs(angle_diff) > fov / 2:
             return
         
-        sprite = self.sprites[sprite_type]
+        # Calculate distance and screen position
+        distance = math.sqrt(dx * dx + dy * dy)
+        if distance < 0.1:
+            return
+        screen_x = int(self.width / 2 + (angle_diff / fov) * self.width)
+        if screen_x < 0 or screen_x >= self.width:
+            return
         
-        for y in range(size):
+        # Calculate sprite size based on distance
+        size = max(1, int(self.height * scale / distance))
+        if size > max_size:
+            return
+        
+        # Skip sprites hidden behind walls in every column they span
+        left = max(0, screen_x - size // 2)
+        right = min(self.width, screen_x - size // 2 + size)
+        if max(self.wall_depth[left:right]) < distance:
+            return
+        billboards.append((distance, screen_x, horizon - size // 2, size, sprite_type, levels))
+
+    def get_scaled_sprite(self, sprite_type, size):
+        """Sprite resampled to size x size, stored as per-column lists of opaque (y, texel)"""
+        key = (sprite_type, size)
+        columns = self.scaled_sprites.get(key)
+        if columns is None:
+            sprite = self.baked_sprites[sprite_type]
+            columns = []
             for x in range(size):
-                screen_x = center_x - size // 2 + x
-                screen_y = center_y + y
-                
-                # Check bounds
-                if (screen_x < 0 or screen_x >= self.width or 
-                    screen_y < 0 or screen_y >= self.height):
-                    continue
-                
-                # Check depth (sprite behind wall?)
-                if self.depth_map[screen_x][screen_y] < distance:
-                    continue
-                
-                # Get sprite pixel
                 sprite_x = int((x / size) * 32)
-                sprite_y = int((y / size) * 32)
-                char, color, alpha = sprite[sprite_y][sprite_x]
-                
-                if alpha > 0:  # Only draw if not transparent
-                    # Only visible with flashlight
-                    brightness = 0
-                    if self.torch_enabled:
-                        flashlight_idx = screen_x + screen_y * self.width
-                        if flashlight_idx < len(self.flashlight_coeff):
-                            brightness = self.battery * self.light_flashlight * self.flashlight_coeff[flashlight_idx] / (distance + 0.5)
-                    
-                    if brightness > 0.3:
-                        if brightness > 0.8:
-                            intensity = f"1;{color}"
-                        elif brightness > 0.4:
-                            intensity = str(color)
+                columns.append([(y, sprite[int((y / size) * 32)][sprite_x]) for y in range(size)
+                                if sprite[int((y / size) * 32)][sprite_x] is not None])
+            self.scaled_sprites[key] = columns
+        return columns
+
+    def draw_billboard(self, frame, distance, center_x, top, size, sprite_type, levels):
+        if sprite_type not in self.baked_sprites:
+            return
+        columns = self.get_scaled_sprite(sprite_type, size)
+        light = self.lighting
+        
+        # Lit level for every brightness bucket at this distance (None = too dark to see)
+        bucket_levels = []
+        for value in light.values:
+            brightness = value / (distance + 0.5)
+            level = None
+            for threshold, threshold_level in levels:
+                if brightness > threshold:
+                    level = threshold_level
+                    break
+            bucket_levels.append(level)
+        
+        buckets, cells = light.buckets, frame.cells
+        width, height = frame.width, frame.height
+        left = center_x - size // 2
+        right = min(size, width - left)
+        step = self.sprite_step  # Sprite columns sampled; each one covers `step` screen columns
+        depth = self.wall_depth
+        for x in range(max(0, -left), right, step):
+            col = left + x
+            # Covered screen columns not hidden behind a nearer wall
+            visible = [c for c in range(col, col + min(step, right - x)) if depth[c] >= distance]
+            if not visible:
+                continue
+            first, count = visible[0], len(visible)
+            contiguous = visible[-1] - first + 1 == count
+            for y, texel in columns[x]:
+                row = top + y
+                if 0 <= row < height:
+                    level = bucket_levels[buckets[col + row * width]]
+                    if level is not None:
+                        base = row * width
+                        if count == 1:
+                            cells[base + first] = texel[level]
+                        elif contiguous:
+                            cells[base + first:base + first + count] = array('H', [texel[level]]) * count
                         else:
-                            intensity = f"2;{color}"
-                        
-                        screen[screen_x][screen_y] = f"\033[{intensity}m{char}\033[0m"
-                        # Update depth map
-                        self.depth_map[screen_x][screen_y] = distance
-
-    def draw_minimap(self, screen):
-        # Draw minimap in top-left corner
-        map_size = len(self.map)
-        for x in range(min(map_size, self.width)):
-            for y in range(min(map_size, self.height)):
-                if x < len(self.map) and y < len(self.map[0]):
-                    if self.map[y][x] != '.':
-                        screen[x][y] = '\033[37m#\033[0m'  # White walls
-                    else:
-                        screen[x][y] = '\033[30m \033[0m'  # Black empty space
+                            for c in visible:
+                                cells[base + c] = texel[level]
+
+    def draw_minimap(self, frame):
+        # Static level layer in the top-left corner, scrolled to keep the player in view
+        minimap = self.minimap
+        minimap.update(self.level)
+        left, top, view_w, view_h = minimap.draw(frame, self.x, self.y)
+        cells, width, scale = frame.cells, frame.width, minimap.scale
+        
+        def plot(x, y, cell):
+            mx, my = int(x) // scale - left, int(y) // scale - top
+            if 0 <= mx < view_w and 0 <= my < view_h:
+                cells[mx + my * width] = cell
+        
+        # Dynamic overlay - only entities inside the window (in level cells)
+        box = (left * scale, top * scale, (left + view_w) * scale, (top + view_h) * scale)
         
         # Draw player
-        px, py = int(self.x), int(self.y)
-        if 0 <= px < self.width and 0 <= py < self.height:
-            screen[px][py] = '\033[97m@\033[0m'  # Bright white player
+        plot(self.x, self.y, MINIMAP_PLAYER)
         
         # Draw ghosts
-        ghost_colors = ['91', '95', '96', '93']  # Red, Magenta, Cyan, Yellow
-        for enemy in self.enemies:
-            if enemy['enabled']:
-                ex, ey = int(enemy['x']), int(enemy['y'])
-                if 0 <= ex < self.width and 0 <= ey < self.height:
-                    color = ghost_colors[enemy['type']]
-                    screen[ex][ey] = f'\033[{color}m*\033[0m'
+        for x, y, kind in self.ghosts.positions(box):
+            plot(x, y, MINIMAP_GHOSTS[kind])
         
         # Draw health pickups on minimap (after ghosts)
-        for pickup in self.health_pickups:
+        for pickup in self.pickups_in(*box):
             if pickup['active']:
-                px, py = int(pickup['x']), int(pickup['y'])
-                if 0 <= px < self.width and 0 <= py < self.height:
-                    screen[px][py] = '\033[92m+\033[0m'  # Green plus
+                plot(pickup['x'], pickup['y'], MINIMAP_PICKUP)
         
         # Draw gate on minimap
         if self.gate_open:
-            gx, gy = int(self.gate_x), int(self.gate_y)
-            if 0 <= gx < self.width and 0 <= gy < self.height:
-                screen[gx][gy] = '\033[93mG\033[0m'  # Yellow gate
-        
-
+            plot(self.gate_x, self.gate_y, MINIMAP_GATE)
 
     def check_enemy_collision(self):
-        for enemy in self.enemies:
-            if not enemy['enabled']:
-                continue
-            dx = enemy['x'] - self.x
-            dy = enemy['y'] - self.y
-            distance = math.sqrt(dx * dx + dy * dy)
-            if distance < 0.5 and self.hp > 0:
-                self.hp = max(0, self.hp - 1)
-                self.damage_timer = 32
-                if self.hp <= 0:
-                    self.game_over = True
-    
-    def draw_health_pickups(self, screen, fov):
-        for pickup in self.health_pickups:
-            if not pickup['active']:
-                continue
-            
-            # Calculate relative position to player
-            dx = pickup['x'] - self.x
-            dy = pickup['y'] - self.y
-            
-            # Calculate angle to pickup relative to player's view
-            pickup_angle = math.atan2(dx, dy)
-            angle_diff = pickup_angle - self.angle
-            
-            # Normalize angle difference
-            while angle_diff > math.pi:
-                angle_diff -= 2 * math.pi
-            while angle_diff < -math.pi:
-                angle_diff += 2 * math.pi
-            
-            # Check if pickup is in field of view
-            if abs(angle_diff) > fov / 2:
-                continue
-            
-            # Calculate distance and screen position
-            distance = math.sqrt(dx * dx + dy * dy)
-            if distance < 0.1:
-                continue
-            
-            # Calculate screen column
-            screen_x = int(self.width / 2 + (angle_diff / fov) * self.width)
-            if screen_x < 0 or screen_x >= self.width:
-                continue
-            
-            # Calculate sprite size based on distance
-            sprite_size = max(1, int(self.height * 0.3 / distance))
-            if sprite_size > 32:
-                continue
-            
-            # Calculate vertical position
-            horizon = self.height // 2 + int(self.z * 2 + self.pitch * self.height * 0.3)
-            sprite_y = horizon - sprite_size // 2
-            
-            # Draw health pickup sprite
-            self.draw_pickup_sprite(screen, screen_x, sprite_y, sprite_size, distance)
-    
-    def draw_pickup_sprite(self, screen, center_x, center_y, size, distance):
-        sprite = self.sprites['health']
-        
-        for y in range(size):
-            for x in range(size):
-                screen_x = center_x - size // 2 + x
-                screen_y = center_y + y
-                
-                # Check bounds
-                if (screen_x < 0 or screen_x >= self.width or 
-                    screen_y < 0 or screen_y >= self.height):
-                    continue
-                
-                # Check depth
-                if self.depth_map[screen_x][screen_y] < distance:
-                    continue
-                
-                # Get sprite pixel
-                sprite_x = int((x / size) * 32)
-                sprite_y = int((y / size) * 32)
-                char, color, alpha = sprite[sprite_y][sprite_x]
-                
-                if alpha > 0:
-                    brightness = 0
-                    if self.torch_enabled:
-                        flashlight_idx = screen_x + screen_y * self.width
-                        if flashlight_idx < len(self.flashlight_coeff):
-                            brightness = self.battery * self.light_flashlight * self.flashlight_coeff[flashlight_idx] / (distance + 0.5)
-                    
-                    if brightness > 0.2:
-                        if brightness > 0.6:
-                            intensity = f"1;{color}"
-                        else:
-                            intensity = str(color)
-                        
-                        screen[screen_x][screen_y] = f"\033[{intensity}m{char}\033[0m"
-                        self.depth_map[screen_x][screen_y] = distance
+        hits = self.ghosts.contacts(self.x, self.y)
+        if hits and self.hp > 0:
+            self.hp = max(0, self.hp - hits)
+            self.damage_timer = 32
+            if self.hp <= 0:
+                self.game_over = True
     
     def check_health_pickup(self):
-        for pickup in self.health_pickups:
+        for pickup in self.nearby_pickups():
             if not pickup['active']:
                 continue
             dx = pickup['x'] - self.x
@@ -757,144 +2458,148 @@ class Big3D:
                 pickup['active'] = False
                 self.hp = min(100, self.hp + 20)
 
-    def run(self):
-        print('\033[2J\033[H')
-        MOVE_SPEED = 0.04  # Slower movement
-        ROTATE_SPEED = 0.06  # Slower rotation/sensitivity
-        while True:
-            if msvcrt.kbhit():
-                key = msvcrt.getch().decode().lower()
-                if key == 'x': break
-                elif key == 'w':
-                    nx = self.x + math.sin(self.angle) * MOVE_SPEED
-                    ny = self.y + math.cos(self.angle) * MOVE_SPEED
-                    if self.map[int(ny)][int(nx)] in ['.', 'G']:
-                        self.x, self.y = nx, ny
-                elif key == 's':
-                    nx = self.x - math.sin(self.angle) * MOVE_SPEED
-                    ny = self.y - math.cos(self.angle) * MOVE_SPEED
-                    if self.map[int(ny)][int(nx)] in ['.', 'G']:
-                        self.x, self.y = nx, ny
-                elif key == 'a': self.angle -= ROTATE_SPEED
-                elif key == 'd': self.angle += ROTATE_SPEED
-                elif key == ' ':
-                    if self.z <= 0: self.z_velocity = 1.5
-                elif key == 'e': self.pitch = max(-1.2, self.pitch - 0.2)
-                elif key == 'q': self.pitch = min(1.2, self.pitch + 0.2)
-                elif key == 'f': self.torch_enabled = not self.torch_enabled  # Toggle torch
-            self.z += self.z_velocity
-            self.z_velocity -= 0.3
-            if self.z < 0:
-                self.z = 0
-                self.z_velocity = 0
-            
-            # Battery drain and scary torch flicker
-            if self.torch_enabled:
-                self.battery *= 0.9995  # Faster drain
-                import random
-                # More dramatic flickering
-                if random.random() < 0.1:  # Occasional dramatic flicker
-                    self.torch_flicker = 0.1 + 0.3 * random.random()
-                else:
-                    self.torch_flicker = 0.6 + 0.4 * random.random()
-            
-            if self.damage_timer > 0:
-                self.damage_timer -= 1
-            
-            self.handle_mouse()
-            self.update_enemies()
-            self.check_enemy_collision()
-            # Check if gate should open (after 2 minutes)
-            if not self.gate_open and time.time() - self.start_time > 120:
-                self.gate_open = True
-            
-            self.check_health_pickup()
-            self.check_gate_collision()
-            self.render()
-            time.sleep(0.03)
-    
-    def draw_gate(self, screen, fov):
-        if not self.gate_open:
-            return
-        
-        # Calculate relative position to player
-        dx = self.gate_x - self.x
-        dy = self.gate_y - self.y
-        
-        # Calculate angle to gate relative to player's view
-        gate_angle = math.atan2(dx, dy)
-        angle_diff = gate_angle - self.angle
-        
-        # Normalize angle difference
-        while angle_diff > math.pi:
-            angle_diff -= 2 * math.pi
-        while angle_diff < -math.pi:
-            angle_diff += 2 * math.pi
-        
-        # Check if gate is in field of view
-        if abs(angle_diff) > fov / 2:
-            return
-        
-        # Calculate distance and screen position
-        distance = math.sqrt(dx * dx + dy * dy)
-        if distance < 0.1:
-            return
-        
-        # Calculate screen column
-        screen_x = int(self.width / 2 + (angle_diff / fov) * self.width)
-        if screen_x < 0 or screen_x >= self.width:
-            return
+    def apply_input(self, state):
+        """Apply everything pressed since the last tick as one combined move"""
+        turn = state.count('d') - state.count('a')
+        if turn:
+            self.angle += turn * ROTATE_SPEED
+        step = state.count('w') - state.count('s')
+        if step:
+            nx = self.x + math.sin(self.angle) * MOVE_SPEED * step
+            ny = self.y + math.cos(self.angle) * MOVE_SPEED * step
+            if self.level.is_open(nx, ny):
+                self.x, self.y = nx, ny
+        if state.count(' ') and self.z <= 0:
+            self.z_velocity = 1.5
+        look = state.count('q') - state.count('e')
+        if look:
+            self.pitch = max(-1.2, min(1.2, self.pitch + 0.2 * look))
+        if state.presses.get('f', 0) % 2: self.torch_enabled = not self.torch_enabled  # Toggle torch
+        if state.presses.get('p', 0) % 2: self.show_hud = not self.show_hud  # Toggle frame-time HUD
+        if state.mouse_dx or state.mouse_dy:
+            self.look(state.mouse_dx, state.mouse_dy)
+        state.clear()
+
+    def update(self):
+        """Advance the world by one fixed TICK_DT step (everything except input and drawing)"""
+        self.sim_time += TICK_DT
+        self.z += self.z_velocity
+        self.z_velocity -= 0.3
+        if self.z < 0:
+            self.z = 0
+            self.z_velocity = 0
         
-        # Calculate sprite size based on distance
-        sprite_size = max(1, int(self.height * 0.6 / distance))
-        if sprite_size > 64:
-            return
+        # Battery drain and scary torch flicker
+        if self.torch_enabled:
+            self.battery *= 0.9995  # Faster drain
+            # More dramatic flickering
+            if self.rng.random() < 0.1:  # Occasional dramatic flicker
+                self.torch_flicker = 0.1 + 0.3 * self.rng.random()
+            else:
+                self.torch_flicker = 0.6 + 0.4 * self.rng.random()
         
-        # Calculate vertical position
-        horizon = self.height // 2 + int(self.z * 2 + self.pitch * self.height * 0.3)
-        sprite_y = horizon - sprite_size // 2
+        if self.damage_timer > 0:
+            self.damage_timer -= 1
         
-        # Draw gate sprite
-        self.draw_gate_sprite(screen, screen_x, sprite_y, sprite_size, distance)
-    
-    def draw_gate_sprite(self, screen, center_x, center_y, size, distance):
-        sprite = self.sprites['gate']
+        prof = self.profiler
+        t = prof.now()
+        self.update_enemies()
+        t = prof.lap('enemies', t)
+        self.check_enemy_collision()
+        t = prof.lap('collision', t)
+        # Check if gate should open (after 2 minutes)
+        if not self.gate_open and self.level.gate and self.sim_time > 120:
+            self.gate_open = True
         
-        for y in range(size):
-            for x in range(size):
-                screen_x = center_x - size // 2 + x
-                screen_y = center_y + y
-                
-                # Check bounds
-                if (screen_x < 0 or screen_x >= self.width or 
-                    screen_y < 0 or screen_y >= self.height):
-                    continue
-                
-                # Check depth
-                if self.depth_map[screen_x][screen_y] < distance:
-                    continue
-                
-                # Get sprite pixel
-                sprite_x = int((x / size) * 32)
-                sprite_y = int((y / size) * 32)
-                char, color, alpha = sprite[sprite_y][sprite_x]
+        self.check_health_pickup()
+        self.check_gate_collision()
+        prof.lap('pickups', t)
+
+    def run(self, input_backend, threaded_output=True):
+        print('\033[2J\033[H', flush=True)
+        if threaded_output:
+            self.writer = FrameWriter(self.out.fileno(), self.output)
+        prof = self.profiler
+        scheduler = self.scheduler = FrameScheduler(1.0 / TICK_DT, self.fps_cap)
+        state = InputState()
+        prof.begin_frame()
+        try:
+            while not state.quit:
+                t = prof.now()
+                input_backend.poll(state)
+                prof.lap('input', t)
                 
-                if alpha > 0:
-                    brightness = 0
-                    if self.torch_enabled:
-                        flashlight_idx = screen_x + screen_y * self.width
-                        if flashlight_idx < len(self.flashlight_coeff):
-                            brightness = self.battery * self.light_flashlight * self.flashlight_coeff[flashlight_idx] / (distance + 0.5)
-                    
-                    if brightness > 0.2:
-                        if brightness > 0.6:
-                            intensity = f"1;{color}"
-                        else:
-                            intensity = str(color)
-                        
-                        screen[screen_x][screen_y] = f"\033[{intensity}m{char}\033[0m"
-                        self.depth_map[screen_x][screen_y] = distance
-    
+                # Simulation runs at a fixed rate no matter how long frames take;
+                # input gathered since the last tick is applied once, on the next tick
+                for _ in range(scheduler.due_ticks()):
+                    if state.quit:
+                        break
+                    self.apply_input(state)
+                    self.update()
+                if scheduler.render_due():
+                    frame_start = time.perf_counter()
+                    self.render()
+                    if self.quality is not None and self.quality.frame(time.perf_counter() - frame_start):
+                        self.apply_quality()
+                    scheduler.frame_rendered()
+                    prof.end_frame(self.frame_count)
+                    prof.begin_frame()
+                scheduler.wait()
+        finally:
+            if self.writer is not None:
+                self.writer.close()
+            if self.band_renderer is not None:
+                self.band_renderer.close()
+            if self.recorder is not None:
+                self.recorder.close()
+            self.screen.close()
+            input_backend.close()
+            prof.close()
+
+    def run_headless(self, ticks, timeline=None):
+        """Replay a scripted input timeline for a number of ticks and time every frame.
+
+        Runs one simulation tick and one render per step, as fast as possible.
+        timeline maps tick -> (keys, mouse_dx, mouse_dy). Returns a stats dict.
+        """
+        script = ScriptedInput(timeline or {})
+        state = InputState()
+        frame_times = []
+        started = time.perf_counter()
+        prof = self.profiler
+        for tick in range(ticks):
+            frame_start = time.perf_counter()
+            prof.begin_frame()
+            script.poll(state)
+            self.apply_input(state)
+            prof.lap('input', frame_start)
+            self.update()
+            render_start = time.perf_counter()
+            self.render()
+            prof.end_frame(self.frame_count)
+            now = time.perf_counter()
+            frame_times.append(now - frame_start)
+            if self.quality is not None and self.quality.frame(now - render_start):
+                self.apply_quality()
+        if self.writer is not None:
+            self.writer.close()
+        if self.band_renderer is not None:
+            self.band_renderer.close()
+        if self.recorder is not None:
+            self.recorder.close()
+        total = time.perf_counter() - started
+        prof.close()
+        stats = frame_stats(frame_times, total, self.output)
+        stats['ghosts'] = len(self.ghosts)
+        stats['ghost_updates_per_s'] = self.ghosts.updates_per_second
+        if self.writer is not None:
+            stats['frames_dropped'] = self.writer.frames_dropped
+        if self.quality is not None:
+            stats['scale'] = self.quality.scale
+            stats['quality_level'] = self.quality.level
+            stats['quality_changes'] = self.quality.changes
+        return stats
+
     def check_gate_collision(self):
         if not self.gate_open:
             return
@@ -904,5 +2609,268 @@ class Big3D:
         if distance < 1.0:
             self.game_won = True
 
+band_game = None  # Wall-pass state inside a BandRenderer worker process
+band_segments = {}  # Shared memory segments attached by this worker, by name
+
+def init_band_worker(scene):
+    global band_game
+    game = Big3D.__new__(Big3D)  # Only the fields the wall pass reads
+    game.__dict__.update(scene)
+    game.level = None
+    game.level_version = None
+    game.lighting = Lighting()
+    game.backdrop = Backdrop()
+    game.frame = FrameBuffer()
+    game.np_map = game.np_solid = game.np_cell_lut = game.np_light_values = None
+    band_game = game
+
+def band_segment(name):
+    segment = band_segments.get(name)
+    if segment is None:
+        # Pool workers share the parent's resource tracker, so attaching here does not
+        # hand over ownership; BandRenderer unlinks every segment it created
+        segment = band_segments[name] = shared_memory.SharedMemory(name=name)
+    return segment
+
+def render_band(frame_name, depth_name, width, height, start, end, fov, pose, light, quality, version):
+    """Draw columns start..end of the wall pass into the shared frame and depth buffers"""
+    game = band_game
+    if version != game.level_version:
+        tiles = band_segment(game.level_name).buf[:game.level_width * game.level_height]
+        game.level = GameMap(game.level_width, game.level_height, bytearray(tiles))
+        game.level_version = version
+        game.np_map = game.np_solid = None
+    game.x, game.y, game.z, game.angle, game.pitch = pose
+    battery, torch_enabled, game.torch_flicker = light
+    game.column_step, game.max_view_dist = quality
+    game.width, game.height = width, height
+    game.lighting.resize(width, height, game.light_flashlight)
+    game.lighting.update(battery, torch_enabled)
+    game.backdrop.update(game.lighting)
+    game.frame.width, game.frame.height = width, height
+    game.frame.cells = band_segment(frame_name).buf[:width * height * 2].cast('H')
+    game.wall_depth = band_segment(depth_name).buf[:width * 8].cast('d')
+    if game.use_numpy:
+        game.render_walls_numpy(fov, start, end)
+    else:
+        game.render_walls(fov, start, end)
+    # Drop the views, and segments left behind by a resize, so they can be closed
+    game.frame.cells = game.wall_depth = None
+    for name in list(band_segments):
+        if name not in (frame_name, depth_name, game.level_name):
+            band_segments.pop(name).close()
+
+class BandRenderer:
+    """Wall pass split into column bands across a process pool.
+
+    Workers draw cell codes and column depths straight into shared memory; each frame
+    they only get the player pose, lighting state and level version. The main process
+    copies the result into its own frame and carries on with sprites and overlays.
+    """
+
+    def __init__(self, game, workers):
+        self.workers = workers
+        level = game.level
+        self.level_shm = shared_memory.SharedMemory(create=True, size=level.width * level.height)
+        self.level_version = None
+        self.frame_shm = self.depth_shm = None
+        self.size = (0, 0)
+        scene = {
+            'level_name': self.level_shm.name, 'level_width': level.width, 'level_height': level.height,
+            'baked_textures': game.baked_textures, 'baked_fallback': game.baked_fallback,
+            'max_view_dist': game.max_view_dist, 'light_flashlight': game.light_flashlight,
+            'use_numpy': game.use_numpy,
+        }
+        self.pool = multiprocessing.Pool(workers, initializer=init_band_worker, initargs=(scene,))
+
+    def release_frame(self):
+        for segment in (self.frame_shm, self.depth_shm):
+            if segment is not None:
+                segment.close()
+                segment.unlink()
+        self.frame_shm = self.depth_shm = None
+
+    def render(self, game, fov):
+        width, height = game.width, game.height
+        if (width, height) != self.size:
+            self.release_frame()
+            self.frame_shm = shared_memory.SharedMemory(create=True, size=width * height * 2)
+            self.depth_shm = shared_memory.SharedMemory(create=True, size=width * 8)
+            self.size = (width, height)
+        level = game.level
+        if level.version != self.level_version:
+            self.level_shm.buf[:len(level.tiles)] = level.tiles
+            self.level_version = level.version
+        
+        pose = (game.x, game.y, game.z, game.angle, game.pitch)
+        light = (game.battery, game.torch_enabled, game.torch_flicker)
+        quality = (game.column_step, game.max_view_dist)
+        # Band edges on multiples of the column step, so the same columns get rays as in one process
+        step = game.column_step
+        edges = [width * i // self.workers // step * step for i in range(self.workers)] + [width]
+        bands = [(start, end) for start, end in zip(edges, edges[1:]) if start < end]
+        self.pool.starmap(render_band, [(self.frame_shm.name, self.depth_shm.name, width, height, start, end,
+                                         fov, pose, light, quality, self.level_version) for start, end in bands])
+        memoryview(game.frame.cells).cast('B')[:] = self.frame_shm.buf[:width * height * 2]
+        memoryview(game.wall_depth).cast('B')[:] = self.depth_shm.buf[:width * 8]
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        self.release_frame()
+        self.level_shm.close()
+        self.level_shm.unlink()
+
+class NullSink:
+    """Output sink that drops frames but counts the characters written"""
+
+    def __init__(self):
+        self.written = 0
+
+    def write(self, text):
+        self.written += len(text)
+
+    def flush(self):
+        pass
+
+def load_timeline(path):
+    """Read a JSON-lines input script: {"tick": 3, "keys": "ww", "dx": 4, "dy": 0}"""
+    timeline = {}
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            event = json.loads(line)
+            keys, dx, dy = timeline.get(event['tick'], ('', 0, 0))
+            timeline[event['tick']] = (keys + event.get('keys', ''),
+                                       dx + event.get('dx', 0), dy + event.get('dy', 0))
+    return timeline
+
+def default_timeline(ticks):
+    """Walk forward with periodic turns and mouse sweeps - used when no script is given"""
+    timeline = {}
+    for tick in range(ticks):
+        keys = 'w'
+        if tick % 40 < 8:
+            keys += 'd'
+        if tick % 200 == 100:
+            keys += 'f'
+        timeline[tick] = (keys, 6 if tick % 90 < 30 else 0, 0)
+    return timeline
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def frame_stats(frame_times, total, output):
+    ordered = sorted(frame_times)
+    return {
+        'frames': len(frame_times),
+        'total_s': total,
+        'fps': len(frame_times) / total if total > 0 else 0.0,
+        'p50_ms': percentile(ordered, 50) * 1000,
+        'p90_ms': percentile(ordered, 90) * 1000,
+        'p99_ms': percentile(ordered, 99) * 1000,
+        'max_ms': (ordered[-1] if ordered else 0.0) * 1000,
+        'bytes_per_frame': output.bytes_per_frame,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="3D ASCII horror game")
+    parser.add_argument('--headless', action='store_true', help="run a scripted replay and report frame timings")
+    parser.add_argument('--ticks', type=int, default=600)
+    parser.add_argument('--size', default='120x40', help="terminal size for headless runs, COLSxROWS")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--script', help="JSON-lines input timeline (default: built-in walk)")
+    parser.add_argument('--sink', choices=['null', 'memory', 'stdout', 'devnull'], default='null',
+                        help="headless output: discard, keep in memory, stdout, or os.devnull through the writer thread")
+    parser.add_argument('--sync-output', action='store_true', help="write frames from the game loop instead of a writer thread")
+    parser.add_argument('--hud', action='store_true', help="show per-stage frame times on a row above the status bar (toggle with P)")
+    parser.add_argument('--fps', type=int, default=60, help="render frame rate cap (0 = uncapped); simulation always ticks at 33/s")
+    parser.add_argument('--trace', help="write per-frame stage timings to this JSON-lines file")
+    parser.add_argument('--swarm', type=int, default=0, help="spawn this many extra ghosts for stress runs")
+    parser.add_argument('--map', help="load the level from this map file (see DEFAULT_LEVEL for the format)")
+    parser.add_argument('--maze', help="play a generated maze of this size, COLSxROWS (seeded by --seed)")
+    parser.add_argument('--render-workers', type=int, default=0,
+                        help="split the wall pass into column bands over this many processes (0 = off)")
+    parser.add_argument('--target-ms', type=float,
+                        help="frame-time budget: lower ray density, sprite detail and view distance to stay under it")
+    parser.add_argument('--flow-radius', type=int,
+                        help="limit ghost pathfinding to this many steps from the player, 0 = whole level "
+                             "(default: whole level up to 64x64 cells, 64 steps on bigger levels)")
+    parser.add_argument('--record', help="record every rendered frame to this session file")
+    parser.add_argument('--record-raw', action='store_true', help="store the recording without zlib compression")
+    parser.add_argument('--replay', help="play a session recording back to the terminal")
+    parser.add_argument('--speed', type=float, default=1.0, help="replay speed multiplier (0 = as fast as possible)")
+    args = parser.parse_args(argv)
+    if args.replay:
+        # --trace gets one JSON line of record and terminal bytes per frame
+        sizes = play_recording(args.replay, sys.stdout, args.speed, args.trace)
+        record_sizes = sorted(record for record, terminal in sizes)
+        print(f"{len(sizes)} frames, record bytes/frame avg {sum(record_sizes) / max(1, len(sizes)):.0f} "
+              f"p99 {percentile(record_sizes, 99):.0f} max {record_sizes[-1] if sizes else 0}, "
+              f"terminal bytes/frame avg {sum(terminal for record, terminal in sizes) / max(1, len(sizes)):.0f}",
+              file=sys.stderr)
+        return
+    profiler = StageProfiler(trace_path=args.trace)
+    level = None
+    if args.map:
+        level = GameMap.load(args.map)
+    elif args.maze:
+        maze_w, maze_h = (int(v) for v in args.maze.lower().split('x'))
+        level = GameMap.generate(maze_w, maze_h, seed=args.seed)
+
+    if not args.headless:
+        input_backend = make_input_backend()
+        if input_backend is None:
+            parser.error("interactive play needs a terminal (msvcrt or termios); use --headless otherwise")
+        try:
+            game = Big3D(profiler=profiler, fps_cap=args.fps, swarm=args.swarm, level=level,
+                         render_workers=args.render_workers)
+            game.show_hud = args.hud
+            if args.flow_radius is not None:
+                game.flow_radius = args.flow_radius or None
+            if args.target_ms:
+                game.quality = QualityController(args.target_ms)
+            if args.record:
+                game.recorder = SessionRecorder(args.record, compress=not args.record_raw)
+        except BaseException:
+            # The terminal is already in cbreak mode with mouse reports on; run() restores it after this
+            input_backend.close()
+            raise
+        game.run(input_backend, threaded_output=not args.sync_output)
+        return
+
+    cols, rows = (int(v) for v in args.size.lower().split('x'))
+    sink = {'null': NullSink, 'memory': io.StringIO, 'stdout': lambda: sys.stdout, 'devnull': NullSink}[args.sink]()
+    timeline = load_timeline(args.script) if args.script else default_timeline(args.ticks)
+    game = Big3D(seed=args.seed, screen_size=(cols, rows), out=sink, profiler=profiler, swarm=args.swarm, level=level,
+                 render_workers=args.render_workers)
+    game.show_hud = args.hud
+    if args.flow_radius is not None:
+        game.flow_radius = args.flow_radius or None
+    if args.target_ms:
+        game.quality = QualityController(args.target_ms)
+    if args.record:
+        game.recorder = SessionRecorder(args.record, compress=not args.record_raw)
+    if args.sink == 'devnull':
+        game.writer = FrameWriter(os.open(os.devnull, os.O_WRONLY), game.output)
+    stats = game.run_headless(args.ticks, timeline)
+    print(f"{stats['frames']} frames at {cols}x{rows} in {stats['total_s']:.2f}s - {stats['fps']:.1f} fps", file=sys.stderr)
+    print(f"frame latency p50 {stats['p50_ms']:.2f}ms  p90 {stats['p90_ms']:.2f}ms  "
+          f"p99 {stats['p99_ms']:.2f}ms  max {stats['max_ms']:.2f}ms  "
+          f"{stats['bytes_per_frame']:.0f} bytes/frame", file=sys.stderr)
+    print(f"{stats['ghosts']} ghosts, {stats['ghost_updates_per_s']:,.0f} ghost updates/s", file=sys.stderr)
+    if 'scale' in stats:
+        print(f"render scale {stats['scale']:.0%} (quality level {stats['quality_level']}, "
+              f"{stats['quality_changes']} changes)", file=sys.stderr)
+    if 'frames_dropped' in stats:
+        print(f"writer thread dropped {stats['frames_dropped']} frames", file=sys.stderr)
+    for stage, (avg, p99) in profiler.summary().items():
+        print(f"  {stage:<10} avg {avg:7.3f}ms  p99 {p99:7.3f}ms", file=sys.stderr)
+
 if __name__ == "__main__":
-    Big3D().run()
\ No newline at end of file
+    main()
\ No newline at end of file